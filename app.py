@@ -1,65 +1,79 @@
-# Main application file that initializes Flask app and sets up routing logic
+# Main application file with the application factory that creates and configures the Flask app
+# Importing this module is cheap: create_app binds the extensions and imports the blueprints, so
+# pre-forking servers can build the app once before forking (`gunicorn --preload "app:create_app()"`)
+# and `flask` commands find create_app on their own
 
-# Import Flask app instance and blueprints
-from config import app
-from blueprints.admin.admin import admin_bp
-from blueprints.manager.manager import manager_bp
-from blueprints.user.user import user_bp
-from blueprints.account.account import account_bp
-from blueprints.database.database import database_bp, db, User
-from flask_migrate import Migrate
-from flask import jsonify, redirect, url_for, request
-from flask_jwt_extended import get_jwt_identity, jwt_required
+import click
+from flask import Flask
+from flask.cli import ScriptInfo
+from config import configure, jwt
 
-# Define allowed HTTP methods for API endpoints
-all_methods = ['GET', 'POST', 'PUT', 'DELETE']
 
-# Register blueprints with their URL prefixes
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(manager_bp, url_prefix='/manager')
-app.register_blueprint(user_bp, url_prefix='/user')
-app.register_blueprint(account_bp)
-app.register_blueprint(database_bp)
+def running_flask_cli():
+    """
+    Return whether the app is being loaded by the flask command, whose click context holds a ScriptInfo.
+    """
+    context = click.get_current_context(silent=True)
+    return context is not None and context.find_object(ScriptInfo) is not None
 
-# Main routing endpoint that handles requests based on user role
-@app.route('/api/<var>', methods=all_methods)
-@jwt_required()  # Requires valid JWT token
-def route_to_blueprint(var):
-    # Get current user from JWT token
-    current_user = User.query.get(get_jwt_identity())
 
-    # Route Admin users to admin blueprint endpoints
-    if current_user.role == 'Admin':
-        if request.method == 'POST':
-            return redirect(url_for('admin.create_task'), code=307)  # 307 preserves HTTP method
-        elif request.method == 'GET':
-            return redirect(url_for('admin.get_tasks'), code=307)
-        elif request.method == 'DELETE':
-            return redirect(url_for('admin.delete_task', task_id=var), code=307)
-        elif request.method == 'PUT':
-            return redirect(url_for('admin.update_task', task_id=var), code=307)
-    # Route Manager users to manager blueprint endpoints
-    elif current_user.role == 'Manager':
-        if request.method == 'POST':
-            return redirect(url_for('manager.create_task'), code=307)
-        elif request.method == 'GET':
-            return redirect(url_for('manager.get_tasks'), code=307)
-        elif request.method == 'PUT':
-            return redirect(url_for('manager.update_task', task_id=var), code=307)
-        elif request.method == 'DELETE':
-            return redirect(url_for('manager.delete_task', task_id=var), code=307)
-    # Route User users to user blueprint endpoints
-    elif current_user.role == 'User':
-        if request.method == 'GET':
-            return redirect(url_for('user.get_tasks'), code=307) 
-        elif request.method == 'PUT':
-            return redirect(url_for('user.update_task', task_id=var), code=307)
-    else:
-        return jsonify({'error': 'Invalid role'}), 403  # Return a 403 error if the role is invalid
+def create_app(config=None):
+    """
+    Create and configure the Flask application.
+    Args:
+        config: Optional dict of settings applied over the environment configuration
+    Returns:
+        Flask app with the extensions bound and every blueprint registered
+    """
+    app = Flask(__name__)
+    configure(app)
+    app.config.update(config or {})
+
+    # Bind the extensions to this app; the database is only connected on first use
+    from blueprints.database.database import database_bp, db, include_object, init_db
+    jwt.init_app(app)
+    init_db(app)
+    # Flask-Migrate and Alembic only serve the `flask db` commands, web workers skip importing them
+    if running_flask_cli():
+        from flask_migrate import Migrate
+        Migrate(app, db, include_object=include_object)
+
+    # Caches, indexes and queues belong to this app, so a second app never sees its data
+    import cache, change_feed, hashing, principal, team_index, write_behind
+    for module in (cache, change_feed, hashing, principal, team_index, write_behind):
+        module.init_app(app)
+
+    # Use the JSON provider selected by JSON_PROVIDER
+    from serializers import init_json_provider
+    init_json_provider(app)
+
+    # Import the blueprints once the extensions are set up
+    from blueprints.admin.admin import admin_bp
+    from blueprints.manager.manager import manager_bp
+    from blueprints.user.user import user_bp
+    from blueprints.account.account import account_bp
+    from blueprints.api.api import api_bp
+    from blueprints.stats.stats import stats_bp
+    from blueprints.changes.changes import changes_bp
+    from blueprints.archive.archive import archive_bp
+
+    # Register blueprints with their URL prefixes
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(manager_bp, url_prefix='/manager')
+    app.register_blueprint(user_bp, url_prefix='/user')
+    app.register_blueprint(account_bp)
+    app.register_blueprint(database_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(stats_bp)
+    app.register_blueprint(changes_bp)
+    app.register_blueprint(archive_bp)
+    # Instrumentation and the /metrics endpoint are opt-in
+    if app.config['METRICS_ENABLED']:
+        from blueprints.metrics.metrics import metrics_bp
+        app.register_blueprint(metrics_bp)
+    return app
 
-# Initialize database migration tool
-migrate = Migrate(app, db)
 
 if __name__ == '__main__':
     # Run the Flask application in debug mode
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,199 @@
+# ASGI entry point: serves the Flask app under an ASGI server such as uvicorn
+# The server's event loop holds every connection and the app runs on a bounded pool of
+# ASGI_THREADS threads, so slow or idle clients no longer each tie up a thread and a burst of
+# connections queues for the pool instead of contending for the GIL and database connections.
+# This is a server option, not an async mode: handlers and the SQLAlchemy session stay
+# synchronous, as Flask runs async views one per thread and gains nothing from an async engine.
+# The adapter is kept over a2wsgi's WSGIMiddleware: in benchmarks.bench_asgi that one served
+# about a quarter fewer requests per second at 128 clients, and it does not report disconnects.
+# A client going away stops its response at the next chunk, and code waiting for something to
+# send (the change feed) is woken through environ[DISCONNECT_KEY]
+#
+# Usage: uvicorn asgi:asgi_app --limit-concurrency N   or   python asgi.py
+
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from app import create_app
+from change_feed import DISCONNECT_KEY
+
+
+class Disconnect:
+    """
+    Flag set when the client of a request disconnects, with callbacks run at that moment.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._set = False
+        self._callbacks = []
+
+    def is_set(self):
+        return self._set
+
+    def set(self):
+        with self._lock:
+            self._set = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_set(self, callback):
+        """
+        Call callback when the client disconnects, at once if it already has.
+        """
+        with self._lock:
+            if not self._set:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class WsgiAdapter:
+    """
+    ASGI application running a WSGI application on a fixed-size thread pool.
+    Args:
+        wsgi_app: WSGI application to serve
+        threads: Number of requests handled at once, further requests wait for a free thread
+    """
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            # Nothing to set up, acknowledge startup and release the threads on shutdown
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    self.executor.shutdown(wait=True)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope ' + scope['type'])
+
+        # Read the whole request body on the event loop before taking a thread
+        body = SpooledTemporaryFile(max_size=65536)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        disconnect = Disconnect()
+
+        async def watch():
+            # The server reports a client that went away as http.disconnect, sends to it are dropped
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnect.set()
+
+        loop = asyncio.get_running_loop()
+        watcher = loop.create_task(watch())
+        try:
+            await loop.run_in_executor(self.executor, self.run, scope, body, send, loop, disconnect)
+        finally:
+            watcher.cancel()
+            body.close()
+
+    def run(self, scope, body, send, loop, disconnect):
+        """
+        Run the WSGI application for one request on a pool thread.
+        The response stops, and its iterable is closed, as soon as the client disconnects.
+        """
+        # The client left while the request waited for a thread
+        if disconnect.is_set():
+            return
+
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            start['message'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+
+        request_environ = environ(scope, body)
+        request_environ[DISCONNECT_KEY] = disconnect
+        output = self.wsgi_app(request_environ, start_response)
+        try:
+            for chunk in output:
+                if disconnect.is_set():
+                    return
+                if not chunk:
+                    continue
+                # Headers go out with the first chunk, so streamed responses start immediately
+                if not start.get('sent'):
+                    start['sent'] = True
+                    sync_send(start['message'])
+                sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            # Closing runs the request teardown of streamed responses
+            if hasattr(output, 'close'):
+                output.close()
+        if disconnect.is_set():
+            return
+        if not start.get('sent'):
+            sync_send(start['message'])
+        sync_send({'type': 'http.response.body'})
+
+
+def environ(scope, body):
+    """
+    Build the WSGI environ of an ASGI HTTP scope.
+    """
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope['http_version'],
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        # Repeated headers are joined as WSGI expects
+        result[name] = result[name] + ',' + value if name in result else value
+    return result
+
+
+# Application served by the ASGI server
+app = create_app()
+asgi_app = WsgiAdapter(app, app.config['ASGI_THREADS'])
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(asgi_app, host='127.0.0.1', port=8000, limit_concurrency=app.config['ASGI_LIMIT_CONCURRENCY'])
@@ -0,0 +1,137 @@
+# Benchmark of the threaded WSGI server against the ASGI deployment (asgi.py under uvicorn)
+# Serves the app in a child process and keeps N concurrent clients busy with task listings
+# and status updates, reporting throughput, failures and tail latency per client count.
+#
+# Usage: python -m benchmarks.bench_asgi [--connections 16,64,256] [--seconds N] [--tasks N]
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from benchmarks.client import QuietHandler, request
+from benchmarks.common import app, auth_header, seed, summarise
+from blueprints.database.database import db, Task, User
+
+# Deployments to compare
+SERVERS = ('wsgi', 'asgi')
+
+
+def serve(kind, port):
+    """
+    Serve the app on the port until killed (runs inside the child process).
+    """
+    if kind == 'wsgi':
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler).serve_forever()
+    else:
+        import uvicorn
+        from asgi import asgi_app
+        uvicorn.run(asgi_app, host='127.0.0.1', port=port, log_level='warning', backlog=4096,
+                    limit_concurrency=app.config['ASGI_LIMIT_CONCURRENCY'])
+
+
+def start_server(kind):
+    """
+    Start a server child process on a free port and wait until it accepts connections.
+    Returns:
+        The process and its base URL
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, '-W', 'ignore', '-m', 'benchmarks.bench_asgi',
+                                '--serve', kind, '--port', str(port)], env=os.environ)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def load(base, clients, seconds):
+    """
+    Run concurrent clients against a server for a number of seconds.
+    Args:
+        clients: List of (headers, task ids the client may update)
+    Returns:
+        Latency summary with the number of failed requests
+    """
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(index, headers, task_ids):
+        rng = random.Random(index)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                if rng.random() < 0.8:
+                    status = request(base, 'GET', '/api/tasks?limit=50', headers)
+                else:
+                    status = request(base, 'PUT', '/api/%d' % rng.choice(task_ids), headers,
+                                     {'status': rng.choice(['Not Started', 'In Progress', 'Done'])})
+            except OSError:
+                # Refused or reset connections count as failures
+                status = 599
+            with lock:
+                if status >= 400:
+                    failures[0] += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(index,) + clients[index % len(clients)])
+               for index in range(len(clients))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(summarise(latencies, time.perf_counter() - started), failures=failures[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded WSGI and ASGI serving under concurrency')
+    parser.add_argument('--connections', default='16,64,256', help='Comma separated concurrent client counts')
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--serve', choices=SERVERS, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    seed(managers=5, users_per_manager=20, tasks=args.tasks)
+    # The server child uses the same database
+    os.environ['DATABASE_URL'] = app.config['SQLALCHEMY_DATABASE_URI']
+    test_client = app.test_client()
+    with app.app_context():
+        users = db.session.scalars(db.select(User).where(User.role == 'User')).all()
+        owned = {}
+        for task_id, assignee in db.session.execute(db.select(Task.id, Task.assigned_to)):
+            owned.setdefault(assignee, []).append(task_id)
+    # One login per user, shared by the clients acting as that user
+    clients = [(auth_header(test_client, user.username), owned[user.id]) for user in users if user.id in owned]
+
+    print(f"{'server':<6} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for count in (int(value) for value in args.connections.split(',')):
+        for kind in SERVERS:
+            process, base = start_server(kind)
+            try:
+                stats = load(base, [clients[index % len(clients)] for index in range(count)], args.seconds)
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{kind:<6} {count:>7} {stats['rps']:>9.1f} {stats['p50_ms']:>8.2f} "
+                  f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['failures']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Benchmark for bulk task writes
+# Compares creating and updating tasks one request at a time with the bulk endpoint.
+#
+# Usage: python -m benchmarks.bench_bulk [--tasks N] [--batch N]
+
+import argparse
+import time
+from benchmarks.common import app, seed, auth_header
+
+
+def task_payload(i):
+    return {'title': f'Bulk {i}', 'description': 'Bulk benchmark task', 'due_date': '01-01-30', 'assigned_to': 2}
+
+
+def rate(name, count, func):
+    """
+    Time func and print how many tasks per second it wrote.
+    """
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f'{name:<40} {count / elapsed:>10.1f} tasks/s  ({elapsed:.2f} s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-item vs bulk task writes')
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    usernames = seed(managers=1, users_per_manager=5, tasks=0)
+    client = app.test_client()
+    headers = auth_header(client, usernames['Admin'])
+
+    def single_creates():
+        for i in range(args.tasks):
+            client.post('/api/tasks', headers=headers, json=task_payload(i))
+
+    def bulk_creates():
+        for start in range(0, args.tasks, args.batch):
+            client.post('/api/tasks/bulk', headers=headers,
+                        json={'create': [task_payload(i) for i in range(start, min(start + args.batch, args.tasks))]})
+
+    def single_updates():
+        for task_id in range(1, args.tasks + 1):
+            client.put(f'/api/{task_id}', headers=headers, json=dict(task_payload(task_id), status='Done'))
+
+    def bulk_updates():
+        for start in range(1, args.tasks + 1, args.batch):
+            client.post('/api/tasks/bulk', headers=headers, json={'update': [
+                {'id': task_id, 'status': 'In Progress'} for task_id in range(start, min(start + args.batch, args.tasks + 1))]})
+
+    rate('single-item create', args.tasks, single_creates)
+    rate(f'bulk create (batch {args.batch})', args.tasks, bulk_creates)
+    rate('single-item update', args.tasks, single_updates)
+    rate(f'bulk update (batch {args.batch})', args.tasks, bulk_updates)
+
+
+if __name__ == '__main__':
+    main()
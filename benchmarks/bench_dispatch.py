@@ -0,0 +1,33 @@
+# Benchmark for the /api role router
+# Measures GET /api/tasks per role against a direct call of the role's blueprint endpoint.
+# Redirects are followed, so running this on a checkout that still answers /api with a
+# 307 measures the full two-request path for comparison.
+#
+# Usage: python -m benchmarks.bench_dispatch [--iterations N] [--tasks N]
+
+import argparse
+from benchmarks.common import app, seed, auth_header, measure, report
+
+# Blueprint prefix serving each role
+role_prefix = {'Admin': '/admin', 'Manager': '/manager', 'User': '/user'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api role dispatch')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100)
+    args = parser.parse_args()
+
+    usernames = seed(managers=2, users_per_manager=5, tasks=args.tasks)
+    client = app.test_client()
+    for role, username in usernames.items():
+        headers = auth_header(client, username)
+        prefix = role_prefix[role]
+        report(f'{role} GET /api/tasks',
+               measure(lambda: client.get('/api/tasks', headers=headers, follow_redirects=True), args.iterations))
+        report(f'{role} GET {prefix}/tasks (direct)',
+               measure(lambda: client.get(prefix + '/tasks', headers=headers), args.iterations))
+
+
+if __name__ == '__main__':
+    main()
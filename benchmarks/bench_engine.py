@@ -0,0 +1,85 @@
+# Load test comparing database engine profiles
+# Each profile runs in its own process (engine settings are read at import) and serves the
+# app through a threaded WSGI server; concurrent clients drive a mixed read/write workload.
+#
+# Usage: python -m benchmarks.bench_engine [--threads N] [--seconds N] [--postgres URL]
+
+import argparse
+import json
+import threading
+import time
+from benchmarks.client import request, run_child, serve
+
+# Environment for each profile; sqlite-default matches SQLite's and pysqlite's defaults
+PROFILES = {
+    'sqlite-default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                       'SQLITE_BUSY_TIMEOUT': '5000', 'SQLITE_MMAP_SIZE': '0'},
+    'sqlite-wal': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL',
+                   'SQLITE_BUSY_TIMEOUT': '5000', 'SQLITE_MMAP_SIZE': str(256 * 1024 * 1024)},
+}
+
+
+def run_profile(args):
+    """
+    Seed the database, serve the app and run the workload (runs inside the child process).
+    """
+    from benchmarks.common import app, seed, auth_header
+
+    usernames = seed(managers=2, users_per_manager=10, tasks=args.tasks)
+    client = app.test_client()
+    admin = auth_header(client, usernames['Admin'])
+    user = auth_header(client, usernames['User'])
+    server, base = serve(app)
+
+    counts = {'ok': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def worker(n):
+        i = 0
+        while time.monotonic() < deadline:
+            i += 1
+            # Mixed workload: listings, task creation and status updates
+            if i % 4 == 0:
+                status = request(base, 'POST', '/api/tasks', admin, {
+                    'title': f'Load {n}-{i}', 'description': 'load', 'due_date': '01-01-30', 'assigned_to': 3})
+            elif i % 4 == 1:
+                status = request(base, 'PUT', f'/api/{1 + (n * 7 + i) % 20}', admin, {
+                    'title': 'Load', 'description': 'load', 'status': 'Done', 'due_date': '01-01-30', 'assigned_to': 3})
+            else:
+                status = request(base, 'GET', '/api/tasks?limit=50', user if i % 2 else admin)
+            with lock:
+                counts['ok' if status < 400 else 'errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    print(json.dumps(dict(counts, rps=counts['ok'] / args.seconds)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare database engine profiles under load')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--postgres', help='PostgreSQL URL to include as a profile (the database is reset)')
+    parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args)
+        return
+
+    profiles = dict(PROFILES)
+    if args.postgres:
+        profiles['postgres'] = {'DATABASE_URL': args.postgres}
+    for name, env in profiles.items():
+        result = run_child('benchmarks.bench_engine', name, env, [
+            '--threads', str(args.threads), '--seconds', str(args.seconds), '--tasks', str(args.tasks)])
+        print(f"{name:<20} {result['rps']:>10.1f} req/s  {result['ok']:>8} ok  {result['errors']:>6} errors")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Benchmark for GET /api/tasks pagination
+# Seeds increasingly large task tables and measures the first page, a page deep into the
+# table and, for comparison, the unpaginated listing. Keyset pages should stay flat.
+#
+# Usage: python -m benchmarks.bench_listing [--sizes 1000,10000,100000] [--limit N]
+
+import argparse
+from collections import namedtuple
+from datetime import date, timedelta
+from benchmarks.common import app, seed, auth_header, measure, report
+from listing import encode_cursor
+
+# Row stand-in used to build a cursor for an arbitrary position
+Position = namedtuple('Position', ['id', 'due_date'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task listing pagination')
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--full-max', type=int, default=10000,
+                        help='Largest table size the unpaginated listing is measured on')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    for size in (int(size) for size in args.sizes.split(',')):
+        usernames = seed(managers=5, users_per_manager=20, tasks=size)
+        headers = auth_header(client, usernames['Admin'])
+        page = f'/api/tasks?limit={args.limit}'
+        deep = page + '&cursor=' + encode_cursor('id', Position(size - args.limit * 2, None))
+        deep_by_date = page + '&sort=due_date&cursor=' + encode_cursor('due_date', Position(size // 2, seed_date(size)))
+        report(f'{size} tasks, first page', measure(lambda: client.get(page, headers=headers), args.iterations))
+        report(f'{size} tasks, deep page by id', measure(lambda: client.get(deep, headers=headers), args.iterations))
+        report(f'{size} tasks, deep page by due_date',
+               measure(lambda: client.get(deep_by_date, headers=headers), args.iterations))
+        report(f'{size} tasks, projected first page',
+               measure(lambda: client.get(page + '&fields=id,status', headers=headers), args.iterations))
+        if size <= args.full_max:
+            report(f'{size} tasks, unpaginated', measure(lambda: client.get('/api/tasks', headers=headers), 20, warmup=2))
+
+
+def seed_date(size):
+    """
+    Due date roughly in the middle of the seeded range.
+    """
+    return date.today() + timedelta(days=(size // 2) % 365)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Benchmark for login throughput and its impact on concurrent task listings
+# Runs a login storm alongside GET /api/tasks readers, once with hashing on the request
+# threads and once with the hashing process pool.
+#
+# Usage: python -m benchmarks.bench_login [--login-threads N] [--seconds N] [--hash-method M]
+
+import argparse
+import json
+import threading
+import time
+from benchmarks.client import request, run_child, serve
+
+# Environment for each profile
+PROFILES = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0'},
+    'pool': {'PASSWORD_HASH_WORKERS': '2'},
+}
+
+
+def run_profile(args):
+    """
+    Serve the app and run logins and listings concurrently (runs inside the child process).
+    """
+    from benchmarks.common import app, seed, auth_header, PASSWORD
+
+    usernames = seed(managers=2, users_per_manager=10, tasks=args.tasks)
+    headers = auth_header(app.test_client(), usernames['User'])
+    server, base = serve(app)
+
+    logins = {'ok': 0, 'busy': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def login_worker():
+        while time.monotonic() < deadline:
+            status = request(base, 'POST', '/login', {}, {'username': usernames['User'], 'password': PASSWORD})
+            with lock:
+                logins['ok' if status == 200 else 'busy'] += 1
+
+    def list_worker():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            request(base, 'GET', '/api/tasks?limit=50', headers)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(args.login_threads)]
+    threads += [threading.Thread(target=list_worker) for _ in range(args.list_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    latencies.sort()
+    print(json.dumps({
+        'logins_per_s': logins['ok'] / args.seconds,
+        'busy': logins['busy'],
+        'list_per_s': len(latencies) / args.seconds,
+        'list_p50_ms': latencies[len(latencies) // 2] * 1000,
+        'list_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login throughput and listing latency')
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--list-threads', type=int, default=2)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:200000')
+    parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args)
+        return
+
+    for name, env in PROFILES.items():
+        result = run_child('benchmarks.bench_login', name, dict(env, PASSWORD_HASH_METHOD=args.hash_method), [
+            '--login-threads', str(args.login_threads), '--list-threads', str(args.list_threads),
+            '--seconds', str(args.seconds), '--tasks', str(args.tasks)])
+        print(f"{name:<10} {result['logins_per_s']:>8.1f} logins/s  {result['busy']:>5} busy  "
+              f"GET /api/tasks {result['list_per_s']:>7.1f} req/s  "
+              f"p50 {result['list_p50_ms']:>7.2f} ms  p99 {result['list_p99_ms']:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
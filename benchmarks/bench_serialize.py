@@ -0,0 +1,66 @@
+# Microbenchmark for task serialization
+# Measures rows/sec from query to JSON text for the former ORM-entity path and the
+# column-tuple serializer, with the stdlib and orjson providers.
+#
+# Usage: python -m benchmarks.bench_serialize [--sizes 1000,100000,1000000]
+
+import argparse
+import time
+from flask.json.provider import DefaultJSONProvider
+from benchmarks.common import app, seed
+from blueprints.database.database import Task
+from serializers import TASK_FIELDS, OrjsonProvider, orjson, row_serializer, task_columns
+
+
+def orm_entities(dumps):
+    # Full entity hydration and per-row strftime, as the blueprints used to do
+    tasks = Task.query.all()
+    return dumps([{
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'due_date': task.due_date.strftime('%Y-%m-%d'),
+        'assigned_to': task.assigned_to
+    } for task in tasks])
+
+
+def column_tuples(dumps):
+    serialize = row_serializer(TASK_FIELDS)
+    rows = Task.query.with_entities(*task_columns(TASK_FIELDS)).all()
+    return dumps([serialize(row) for row in rows])
+
+
+def best_rate(func, dumps, rows, repeat):
+    """
+    Best rows/sec over repeat runs.
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(dumps)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task serialization')
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    args = parser.parse_args()
+
+    providers = {'json': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+    for size in (int(size) for size in args.sizes.split(',')):
+        seed(managers=5, users_per_manager=20, tasks=size)
+        repeat = 5 if size <= 100000 else 1
+        with app.app_context():
+            for name, provider in providers.items():
+                for label, func in (('ORM entities', orm_entities), ('column tuples', column_tuples)):
+                    rate = best_rate(func, provider.dumps, size, repeat)
+                    print(f'{size:>9} rows  {label:<14} {name:<7} {rate:>12.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Benchmark of process startup: importing the app module, building the app with create_app
+# and serving the first request, each measured in a fresh interpreter as a web worker would
+# start. A run with `python -X importtime` reports the modules whose import costs the most.
+#
+# Usage: python -m benchmarks.bench_startup [--runs N] [--top N]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs inside the child: time each startup stage and report them with the peak RSS
+CHILD = '''
+import json, resource, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get('/api/tasks').status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'status': status,
+                  'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def run_child(env, importtime=False):
+    """
+    Start the app in a fresh interpreter.
+    Returns:
+        Stage timings of the child and its stderr (the -X importtime report if requested)
+    """
+    command = [sys.executable, '-W', 'ignore'] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(report):
+    """
+    Parse a -X importtime report.
+    Returns:
+        Dict of top-level package to the time spent importing its modules, in milliseconds
+    """
+    packages = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        # Own time of every module, so nested imports are counted under their own package
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(own) / 1000
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app import, creation and first request time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='Most expensive imports to list')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='taskapi-bench-'), 'bench.db'))
+    # The first run warms the file system cache and the bytecode cache
+    run_child(env)
+    runs = [run_child(env)[0] for _ in range(args.runs)]
+    for stage in ('import', 'create_app', 'first_request'):
+        samples = [run[stage] * 1000 for run in runs]
+        print(f'{stage:<16} {statistics.median(samples):>8.1f} ms median  {min(samples):>8.1f} ms min')
+    total = [(run['import'] + run['create_app'] + run['first_request']) * 1000 for run in runs]
+    print(f"{'total':<16} {statistics.median(total):>8.1f} ms median  {min(total):>8.1f} ms min")
+    print(f"{'peak rss':<16} {statistics.median(run['rss_mb'] for run in runs):>8.1f} MB")
+
+    _, report = run_child(env, importtime=True)
+    packages = parse_importtime(report)
+    print(f'\nimport time by top-level package ({sum(packages.values()):.1f} ms in total):')
+    for package, elapsed in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {package:<24} {elapsed:>8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
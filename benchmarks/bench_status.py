@@ -0,0 +1,78 @@
+# Benchmark of user status updates written synchronously against the write-behind queue
+# Concurrent users flip statuses of their own tasks through a threaded WSGI server; a
+# write-behind run only ends once every queued update has reached the database.
+#
+# Usage: python -m benchmarks.bench_status [--updates N] [--concurrency N] [--tasks N]
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.client import request, serve
+from benchmarks.common import app, auth_header, bench_dir, seed, summarise
+from blueprints.database.database import db, Task, User
+import write_behind
+
+
+def run(base, clients, updates, concurrency):
+    """
+    Send status updates from the clients and return the latency summary with acknowledged req/s.
+    """
+    rng = random.Random(1)
+    work = []
+    for _ in range(updates):
+        headers, task_ids = rng.choice(clients)
+        work.append((headers, rng.choice(task_ids), rng.choice(['Not Started', 'In Progress', 'Done'])))
+
+    def update(item):
+        headers, task_id, new_status = item
+        started = time.perf_counter()
+        status = request(base, 'PUT', '/api/%d' % task_id, headers, {'status': new_status})
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(update, work))
+    acknowledged = time.perf_counter() - started
+    # Queued updates count once they are written
+    with app.app_context():
+        queue = write_behind.get_queue()
+    while queue is not None and queue.statuses():
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    return (dict(summarise([latency for latency, _ in outcomes], elapsed),
+                 ack_rps=len(outcomes) / acknowledged, failures=sum(status >= 400 for _, status in outcomes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare synchronous and write-behind status updates')
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--tasks', type=int, default=10000)
+    args = parser.parse_args()
+
+    seed(managers=5, users_per_manager=20, tasks=args.tasks)
+    app.config['STATUS_JOURNAL_PATH'] = os.path.join(bench_dir, 'status-journal.log')
+    test_client = app.test_client()
+    with app.app_context():
+        users = db.session.scalars(db.select(User).where(User.role == 'User')).all()
+        owned = {}
+        for task_id, assignee in db.session.execute(db.select(Task.id, Task.assigned_to)):
+            owned.setdefault(assignee, []).append(task_id)
+    clients = [(auth_header(test_client, user.username), owned[user.id]) for user in users if user.id in owned]
+
+    server, base = serve(app)
+    try:
+        print(f"{'mode':<13} {'ack req/s':>9} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+        for mode in ('synchronous', 'write-behind'):
+            app.config['STATUS_WRITE_BEHIND'] = mode == 'write-behind'
+            stats = run(base, clients, args.updates, args.concurrency)
+            print(f"{mode:<13} {stats['ack_rps']:>9.1f} {stats['rps']:>9.1f} {stats['p50_ms']:>8.2f} "
+                  f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['failures']:>7}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
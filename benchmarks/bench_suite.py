@@ -0,0 +1,270 @@
+# Load test of the whole API with a mixed, reproducible workload
+# Seeds admins, managers, users and tasks, then replays one pre-generated schedule of
+# logins, listings, creates, updates and deletes per role through the Flask test client
+# and/or a threaded WSGI server. Reports throughput and p50/p95/p99 latency per role and
+# operation, and compares against a stored baseline (exit status 1 on a regression).
+#
+# Usage: python -m benchmarks.bench_suite [--mode testclient|wsgi|both] [--requests N]
+#        [--admins N] [--managers N] [--users-per-manager N] [--tasks N] [--seed N]
+#        [--save-baseline FILE] [--baseline FILE] [--tolerance 0.2] [--min-samples 50]
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.client import request, serve
+from benchmarks.common import app, auth_header, seed, summarise, PASSWORD
+from cache import tasks_changed
+from blueprints.database.database import db, Task, User
+
+# Operation weights per role; an operation with nothing left to act on falls back to list
+WORKLOAD = {
+    'Admin': {'list': 40, 'create': 20, 'update': 25, 'delete': 10, 'login': 5},
+    'Manager': {'list': 50, 'create': 20, 'update': 20, 'delete': 5, 'login': 5},
+    'User': {'list': 70, 'update': 25, 'login': 5},
+}
+
+# Share of requests sent by each role
+ROLE_WEIGHTS = {'Admin': 1, 'Manager': 2, 'User': 7}
+
+# Tasks seeded for each manager, the only tasks managers may update or delete
+MANAGER_TASKS = 200
+
+
+def prepare(args):
+    """
+    Seed the database and log in the clients of the workload.
+    Returns:
+        Dict of role to list of client states (username, headers and task ids to act on)
+    """
+    seed(managers=args.managers, users_per_manager=args.users_per_manager, tasks=args.tasks, admins=args.admins)
+    with app.app_context():
+        users = db.session.execute(db.select(User.id, User.username, User.role, User.manager_id)).all()
+        # Manager update and delete only apply to tasks assigned to the manager
+        managers = [user for user in users if user.role == 'Manager']
+        if managers:
+            db.session.execute(Task.__table__.insert(), [{
+                'title': f'Manager task {i}',
+                'description': 'Benchmark task',
+                'status': 'Not Started',
+                'due_date': date.today(),
+                'assigned_to': manager.id,
+            } for manager in managers for i in range(MANAGER_TASKS)])
+            db.session.commit()
+        tasks = db.session.execute(db.select(Task.id, Task.assigned_to).order_by(Task.id)).all()
+        # Listings cached by an earlier run in this process describe the old data
+        tasks_changed([user.id for user in users])
+
+    client = app.test_client()
+    clients = {role: [] for role in WORKLOAD}
+    for user in users:
+        if len(clients[user.role]) >= args.clients_per_role:
+            continue
+        owned = [task.id for task in tasks if task.assigned_to == user.id]
+        clients[user.role].append({
+            'username': user.username,
+            'headers': auth_header(client, user.username),
+            # Every tenth task can be deleted, the others are only updated so updates never miss
+            'update_ids': [task_id for task_id in owned if task_id % 10],
+            'delete_ids': [task_id for task_id in owned if not task_id % 10],
+            'assignees': [other.id for other in users if other.manager_id == user.id],
+        })
+    # Admins update and delete across every user's tasks
+    user_tasks = [task.id for task in tasks if task.assigned_to not in {manager.id for manager in managers}]
+    everyone = [user.id for user in users if user.role == 'User']
+    for index, admin in enumerate(clients['Admin']):
+        admin['update_ids'] = [task_id for task_id in user_tasks if task_id % 10]
+        # Split deletable tasks between admins so no task is deleted twice
+        admin['delete_ids'] = [task_id for task_id in user_tasks if not task_id % 10][index::len(clients['Admin'])]
+        admin['assignees'] = everyone
+        # Admin updates keep the assignee so user updates of the same task still succeed
+        admin['owners'] = {task.id: task.assigned_to for task in tasks}
+    return clients
+
+
+def schedule(clients, count, rng):
+    """
+    Generate the requests of one run.
+    Returns:
+        List of (label, method, path, headers, body) tuples
+    """
+    roles = [role for role in ROLE_WEIGHTS if clients[role]]
+    # Copy the pools so each run of the schedule starts from the same state
+    pools = {id(state): list(state['delete_ids']) for role in roles for state in clients[role]}
+    requests = []
+    for _ in range(count):
+        role = rng.choices(roles, [ROLE_WEIGHTS[role] for role in roles])[0]
+        state = rng.choice(clients[role])
+        operations = WORKLOAD[role]
+        op = rng.choices(list(operations), list(operations.values()))[0]
+        due_date = '%02d-%02d-26' % (rng.randint(1, 28), rng.randint(1, 12))
+        if op == 'create' and state['assignees']:
+            requests.append((role + ' create', 'POST', '/api/tasks', state['headers'], {
+                'title': 'Load test', 'description': 'Created by bench_suite',
+                'due_date': due_date, 'assigned_to': rng.choice(state['assignees'])}))
+        elif op == 'update' and state['update_ids']:
+            task_id = rng.choice(state['update_ids'])
+            body = {'status': rng.choice(['Not Started', 'In Progress', 'Done'])}
+            if role != 'User':
+                body.update(title='Updated', description='Updated by bench_suite', due_date=due_date)
+            if role == 'Admin':
+                body['assigned_to'] = state['owners'][task_id]
+            requests.append((role + ' update', 'PUT', '/api/%d' % task_id, state['headers'], body))
+        elif op == 'delete' and pools[id(state)]:
+            task_id = pools[id(state)].pop(rng.randrange(len(pools[id(state)])))
+            requests.append((role + ' delete', 'DELETE', '/api/%d' % task_id, state['headers'], None))
+        elif op == 'login':
+            requests.append((role + ' login', 'POST', '/login', {},
+                             {'username': state['username'], 'password': PASSWORD}))
+        else:
+            requests.append((role + ' list', 'GET', '/api/tasks?limit=50', state['headers'], None))
+    return requests
+
+
+def run(requests, send, concurrency):
+    """
+    Send every request and collect latencies per label.
+    Args:
+        requests: Schedule from schedule()
+        send: Callable taking (method, path, headers, body) and returning the status code
+        concurrency: Number of threads sending requests
+    Returns:
+        Results with the overall summary and one summary per label
+    """
+    def timed(item):
+        label, method, path, headers, body = item
+        started = time.perf_counter()
+        status = send(method, path, headers, body)
+        return label, time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(timed, requests))
+    else:
+        outcomes = [timed(item) for item in requests]
+    elapsed = time.perf_counter() - started
+
+    samples, errors = {}, {}
+    for label, latency, status in outcomes:
+        samples.setdefault(label, []).append(latency)
+        errors[label] = errors.get(label, 0) + (status >= 400)
+    results = {'total': dict(summarise([latency for _, latency, _ in outcomes], elapsed),
+                             requests=len(outcomes), errors=sum(errors.values()))}
+    for label in sorted(samples):
+        results[label] = dict(summarise(samples[label], elapsed), requests=len(samples[label]), errors=errors[label])
+    return results
+
+
+def print_results(mode, results, baseline=None):
+    """
+    Print a results table, with changes against the baseline when one is given.
+    """
+    print(f'\n== {mode}')
+    print(f"{'':<20} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, stats in results.items():
+        line = (f"{label:<20} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>9.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        if baseline and label in baseline:
+            line += '   p95 %+6.1f%%' % change(baseline[label]['p95_ms'], stats['p95_ms'])
+            if label == 'total':
+                line += '  req/s %+6.1f%%' % change(baseline[label]['rps'], stats['rps'])
+        print(line)
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def regressions(results, baseline, tolerance, min_samples):
+    """
+    List the measurements worse than the baseline by more than tolerance (a fraction).
+    Latency of operations with fewer than min_samples requests is too noisy to compare.
+    """
+    found = []
+    for mode, labels in results.items():
+        for label, stats in labels.items():
+            base = baseline.get(mode, {}).get(label)
+            if base is None:
+                continue
+            if stats['requests'] >= min_samples and stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                found.append(f"{mode} {label}: p95 {base['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+            if label == 'total' and stats['rps'] < base['rps'] * (1 - tolerance):
+                found.append(f"{mode} {label}: {base['rps']:.1f} -> {stats['rps']:.1f} req/s")
+            if stats['errors'] > base['errors']:
+                found.append(f"{mode} {label}: errors {base['errors']} -> {stats['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed workload load test of the whole API')
+    parser.add_argument('--mode', choices=['testclient', 'wsgi', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads in wsgi mode')
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--managers', type=int, default=5)
+    parser.add_argument('--users-per-manager', type=int, default=20)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--clients-per-role', type=int, default=5, help='Accounts logged in per role')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the schedule')
+    parser.add_argument('--baseline', help='Results file to compare against')
+    parser.add_argument('--save-baseline', help='Write the results to this file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before failing (fraction)')
+    parser.add_argument('--min-samples', type=int, default=50, help='Requests needed to compare an operation')
+    args = parser.parse_args()
+
+    modes = ['testclient', 'wsgi'] if args.mode == 'both' else [args.mode]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings(args):
+            print('warning: baseline was recorded with other settings:', baseline.get('settings'))
+
+    results = {}
+    for mode in modes:
+        # Reseed per mode so both start from the same data and replay the same schedule
+        clients = prepare(args)
+        requests = schedule(clients, args.requests, random.Random(args.seed))
+        if mode == 'testclient':
+            client = app.test_client()
+
+            def send(method, path, headers, body):
+                return client.open(path, method=method, headers=headers, json=body).status_code
+            results[mode] = run(requests, send, 1)
+        else:
+            server, base = serve(app)
+
+            def send(method, path, headers, body):
+                return request(base, method, path, headers, body)
+            try:
+                results[mode] = run(requests, send, args.concurrency)
+            finally:
+                server.shutdown()
+        print_results(mode, results[mode], baseline and baseline['results'].get(mode))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'settings': settings(args), 'results': results}, f, indent=2)
+    if baseline:
+        found = regressions(results, baseline['results'], args.tolerance, args.min_samples)
+        for line in found:
+            print('REGRESSION', line)
+        sys.exit(1 if found else 0)
+
+
+def settings(args):
+    """
+    Settings that must match for results to be comparable.
+    """
+    keys = ('requests', 'concurrency', 'admins', 'managers', 'users_per_manager', 'tasks', 'clients_per_role', 'seed')
+    return dict({key: getattr(args, key) for key in keys},
+                database=app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+                password_hash_method=app.config['PASSWORD_HASH_METHOD'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# HTTP helpers for benchmarks that drive the app through a real WSGI server
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+def request(base, method, path, headers, body=None):
+    """
+    Send one HTTP request and return its status code.
+    """
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method,
+                                 headers=dict(headers, **{'Content-Type': 'application/json'}))
+    try:
+        with urllib.request.urlopen(req) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class QuietHandler(WSGIRequestHandler):
+    """
+    Request handler that does not log every request.
+    """
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app):
+    """
+    Serve the app with a threaded WSGI server on a free port in a background thread.
+    Returns:
+        The server (call shutdown() when done) and its base URL
+    """
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def run_child(module, profile, env, args):
+    """
+    Run a benchmark module with --run-profile in a fresh process with extra environment.
+    Settings read at import time (engine, hashing pool) can only change per process.
+    Returns:
+        The JSON object printed on the child's last output line
+    """
+    # A fresh temporary SQLite database unless the profile names one
+    child_env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+    child_env.update(env)
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-m', module, '--run-profile', profile] + args,
+        env=child_env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
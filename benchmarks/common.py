@@ -0,0 +1,117 @@
+# Shared helpers for the benchmark scripts: temporary database, seeding and timing
+
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Point the app at a throwaway SQLite database before it is imported
+bench_dir = tempfile.mkdtemp(prefix='taskapi-bench-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(bench_dir, 'bench.db'))
+
+from app import create_app  # noqa: E402
+from blueprints.database.database import db, User, Task  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+# Application shared by the benchmarks
+app = create_app()
+
+# Password shared by every seeded account
+PASSWORD = 'benchmark'
+
+
+def seed(managers=5, users_per_manager=20, tasks=10000, admins=1):
+    """
+    Create a fresh schema and seed it with admins, managers, users and tasks.
+    Args:
+        admins: Number of Admin accounts ('admin', then 'admin1', 'admin2', ...)
+        managers: Number of Manager accounts
+        users_per_manager: Number of User accounts reporting to each manager
+        tasks: Number of tasks spread round-robin over the users
+    Returns:
+        Dict with the seeded usernames per role
+    """
+    # Hash once and reuse it, seeding should not be dominated by pbkdf2
+    hashed = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'], salt_length=16)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for a in range(admins):
+            db.session.add(User(username=f'admin{a}' if a else 'admin', password=hashed, role='Admin'))
+        db.session.flush()
+        user_ids = []
+        for m in range(managers):
+            manager = User(username=f'manager{m}', password=hashed, role='Manager')
+            db.session.add(manager)
+            db.session.flush()
+            for u in range(users_per_manager):
+                user = User(username=f'user{m}_{u}', password=hashed, role='User', manager_id=manager.id)
+                db.session.add(user)
+                db.session.flush()
+                user_ids.append(user.id)
+        # Bulk insert tasks in one executemany
+        start = date.today()
+        if tasks:
+            db.session.execute(Task.__table__.insert(), [{
+                'title': f'Task {i}',
+                'description': f'Benchmark task {i}',
+                'status': 'Not Started',
+                'due_date': start + timedelta(days=i % 365),
+                'assigned_to': user_ids[i % len(user_ids)] if user_ids else None,
+            } for i in range(tasks)])
+        db.session.commit()
+    return {
+        'Admin': 'admin' if admins else None,
+        'Manager': 'manager0' if managers else None,
+        'User': 'user0_0' if managers and users_per_manager else None,
+    }
+
+
+def auth_header(client, username):
+    """
+    Log in through the API and return an Authorization header for the user.
+    """
+    response = client.post('/login', json={'username': username, 'password': PASSWORD})
+    return {'Authorization': 'Bearer ' + response.get_json()['access token']}
+
+
+def summarise(samples, elapsed):
+    """
+    Summarise latency samples taken over elapsed seconds.
+    Returns:
+        Dict with requests/sec and p50/p95/p99 latency in milliseconds
+    """
+    samples = sorted(samples)
+
+    def percentile(q):
+        return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000 if samples else 0.0
+    return {
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def measure(func, iterations, warmup=10):
+    """
+    Call func repeatedly and summarise its latency.
+    Returns:
+        Dict with requests/sec and p50/p95/p99 latency in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return summarise(samples, time.perf_counter() - started)
+
+
+def report(name, stats):
+    """
+    Print one result line.
+    """
+    print(f"{name:<40} {stats['rps']:>10.1f} req/s  p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms")
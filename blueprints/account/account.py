@@ -1,10 +1,11 @@
 # Account Blueprint: Handles user registration and login operations
 
 from flask import Blueprint
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from blueprints.database.database import db, User
 from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
+from principal import role_claims
+from hashing import HashingBusy, hash_password, needs_rehash, verify_password
 
 # Initialize blueprint for account operations
 account_bp = Blueprint('account', __name__)
@@ -15,19 +16,23 @@ def register():
     Register a new user.
     Returns:
         JSON message and 201 status code on success
+        Error message and 503 status code if password hashing is saturated
         Error message and 500 status code on failure
     """
     try:
         # Get request data
         data = request.get_json()
-        # Hash the user's password
-        hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256', salt_length=16)
+        # Hash the user's password in the hashing pool
+        hashed_password = hash_password(data['password'])
         # Create new user with hashed password
         new_user = User(username=data['username'], password=hashed_password, role=data['role'], manager_id=data.get('manager_id'))
         # Add and commit new user to database
         db.session.add(new_user)
         db.session.commit()
         return jsonify({'message': 'User created successfully'}), 201
+    except HashingBusy:
+        # Ask the client to retry once the login burst has passed
+        return jsonify({'message': 'Server busy, retry later'}), 503, {'Retry-After': '1'}
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to create a User', 'error': print(e)}), 500
@@ -39,18 +44,31 @@ def login():
     Returns:
         JSON access token and 200 status code on success
         Error message and 401 status code on failure
+        Error message and 503 status code if password hashing is saturated
     """
     try:
         # Get request data
         data = request.get_json()
         # Query user by username
         user = User.query.filter_by(username=data['username']).first()
-        # Verify password
-        if not user or not check_password_hash(user.password, data['password']):
+        # Verify password in the hashing pool
+        if not user or not verify_password(user.password, data['password']):
             return jsonify({'message': 'Invalid credentials'}), 401
-        # Create access token for user
-        access_token = create_access_token(identity=user.id)
+        # Upgrade hashes made with older parameters while the plain password is at hand
+        if needs_rehash(user.password):
+            user.password = hash_password(data['password'])
+            db.session.commit()
+        # Create access token for user, embedding role claims when enabled
+        claims = role_claims(user)
+        if claims:
+            access_token = create_access_token(identity=user.id, additional_claims=claims,
+                                               expires_delta=current_app.config['JWT_ROLE_CLAIMS_EXPIRES'])
+        else:
+            access_token = create_access_token(identity=user.id)
         return jsonify({'access token': access_token})
+    except HashingBusy:
+        # Ask the client to retry once the login burst has passed
+        return jsonify({'message': 'Server busy, retry later'}), 503, {'Retry-After': '1'}
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to login', 'error': print(e)}), 500
@@ -2,8 +2,11 @@
 # Provides endpoints for creating, viewing, updating, and deleting tasks
 
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import get_jwt_identity, jwt_required
-from blueprints.database.database import User, Task, db
+from blueprints.database.database import Task, db
+from blueprints.archive.archive import missing_task
+from bulk import BulkError, run_bulk
+from cache import tasks_changed
+from listing import task_listing
 from roles import role_required
 from datetime import datetime
 
@@ -11,18 +14,17 @@ from datetime import datetime
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/tasks', methods=['POST'])
-@jwt_required()  # Require valid JWT token
 @role_required('Admin')  # Restrict to Admin role
-def create_task():
+def create_task(user):
     """
     Create a new task.
+    Args:
+        user: Authenticated user resolved by role_required
     Returns:
         JSON message and 200 status code on success
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         # Get request data
         data = request.get_json()
 
@@ -37,6 +39,8 @@ def create_task():
             # Add and commit new task to database
             db.session.add(new_task)
             db.session.commit()
+            # Invalidate cached listings that include the task
+            tasks_changed([new_task.assigned_to])
             return jsonify({'message': 'Task created'}), 200
         else:
             # Return unauthorized if validation fails
@@ -46,80 +50,75 @@ def create_task():
         return jsonify({'message': 'Failed to create task', 'error': print(e)}), 500
 
 @admin_bp.route('/tasks', methods=['GET'])
-@jwt_required()  # Require valid JWT token
 @role_required('Admin')  # Restrict to Admin role
-def get_tasks():
+def get_tasks(user):
     """
     Retrieve all tasks.
+    Args:
+        user: Authenticated user resolved by role_required
     Returns:
         JSON array of tasks and 200 status code on success
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         if user.role == 'Admin':
-            # Query all tasks
-            tasks = Task.query.all()
-            # Format tasks for JSON response
-            return jsonify([{
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'status': task.status,
-                    'due_date': task.due_date.strftime('%Y-%m-%d'),
-                    'assigned_to': task.assigned_to
-                } for task in tasks]), 200
+            # Query all tasks, paginated and projected from the query string
+            return task_listing(Task.query, 'admin')
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to retrieve tasks', 'error': print(e)}), 500
 
 @admin_bp.route('/tasks/<int:task_id>', methods=['DELETE'])
-@jwt_required()  # Require valid JWT token
 @role_required('Admin')  # Restrict to Admin role
-def delete_task(task_id):
+def delete_task(user, task_id):
     """
     Delete a specific task.
     Args:
+        user: Authenticated user resolved by role_required
         task_id: Integer ID of the task to delete
     Returns:
         JSON message and 200 status code on success
+        Error message and 404 status code if the task does not exist, 409 if it was archived
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         if user.role == 'Admin':
             # Find task by ID
             task = Task.query.filter_by(id=task_id).first()
+            if task is None:
+                return missing_task(task_id)
             # Remove task from database
             db.session.delete(task)
             db.session.commit()
+            # Invalidate cached listings that included the task
+            tasks_changed([task.assigned_to])
             return jsonify({'message': 'Task deleted'}), 200
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to delete task', 'error': print(e)}), 500
 
 @admin_bp.route('/tasks/<int:task_id>', methods=['PUT'])
-@jwt_required()  # Require valid JWT token
 @role_required('Admin')  # Restrict to Admin role
-def update_task(task_id):
+def update_task(user, task_id):
     """
     Update a specific task.
     Args:
+        user: Authenticated user resolved by role_required
         task_id: Integer ID of the task to update
     Returns:
         JSON message and 200 status code on success
+        Error message and 404 status code if the task does not exist, 409 if it was archived
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         # Get request data
         data = request.get_json()
         if user.role == 'Admin':
             # Find task by ID
             task = Task.query.filter_by(id=task_id).first()
+            if task is None:
+                return missing_task(task_id)
+            previous_assignee = task.assigned_to
             # Update task fields with new data
             task.title = data['title']
             task.description = data['description']
@@ -128,7 +127,34 @@ def update_task(task_id):
             task.assigned_to = data['assigned_to']
             # Save changes to database
             db.session.commit()
+            # Invalidate cached listings for the previous and new assignee
+            tasks_changed([previous_assignee, task.assigned_to])
             return jsonify({'message': 'Task updated'}), 200
     except Exception as e:
         # Log error and return 500 response
-        return jsonify({'message': 'Failed to update task', 'error': print(e)}), 500
\ No newline at end of file
+        return jsonify({'message': 'Failed to update task', 'error': print(e)}), 500
+
+@admin_bp.route('/tasks/bulk', methods=['POST'])
+@role_required('Admin')  # Restrict to Admin role
+def bulk_tasks(user):
+    """
+    Create, update and delete tasks in one batch.
+    Args:
+        user: Authenticated user resolved by role_required
+    Returns:
+        JSON per-item results and 200 status code on success
+        JSON per-item results and 400 status code if any item is invalid (nothing is written)
+        Error message and 500 status code on failure
+    """
+    try:
+        # Get request data
+        data = request.get_json()
+        # Apply the whole batch, any assignee and any task allowed
+        results = run_bulk(data, update_fields=('title', 'description', 'status', 'due_date', 'assigned_to'))
+        return jsonify({'message': 'Batch applied', 'results': results}), 200
+    except BulkError as e:
+        # Return the per-item validation results
+        return jsonify({'message': 'Invalid batch', 'results': e.results}), 400
+    except Exception as e:
+        # Log error and return 500 response
+        return jsonify({'message': 'Failed to apply batch', 'error': print(e)}), 500
\ No newline at end of file
@@ -0,0 +1,90 @@
+# API Blueprint: Routes /api requests to the handler of the caller's role
+# Provides the /api/<var> and /api/tasks/bulk endpoints, dispatched in-process
+
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request
+from blueprints.admin import admin
+from blueprints.manager import manager
+from blueprints.user import user
+from instrumentation import label_endpoint, span
+from principal import current_principal
+
+# Initialize blueprint for the role router
+api_bp = Blueprint('api', __name__)
+
+# Define allowed HTTP methods for API endpoints
+all_methods = ['GET', 'POST', 'PUT', 'DELETE']
+
+# Handlers for each role keyed by HTTP method, called in-process by the /api router
+role_handlers = {
+    'Admin': {
+        'POST': admin.create_task,
+        'GET': admin.get_tasks,
+        'PUT': admin.update_task,
+        'DELETE': admin.delete_task,
+    },
+    'Manager': {
+        'POST': manager.create_task,
+        'GET': manager.get_tasks,
+        'PUT': manager.update_task,
+        'DELETE': manager.delete_task,
+    },
+    'User': {
+        'GET': user.get_tasks,
+        'PUT': user.update_task,
+    },
+}
+
+# Methods whose <var> segment is a task id
+task_id_methods = ('PUT', 'DELETE')
+
+# Main routing endpoint that handles requests based on user role
+@api_bp.route('/api/<var>', methods=all_methods)
+def route_to_blueprint(var):
+    # Requires valid JWT token
+    with span('jwt'):
+        verify_jwt_in_request()
+    # Get current user from JWT token, loaded once and shared with the handler
+    current_user = current_principal()
+    if current_user is None:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    # Resolve the handler in its own span, the hop that used to be a redirect
+    with span('dispatch'):
+        # Return a 403 error if the role is invalid
+        if current_user.role not in role_handlers:
+            return jsonify({'error': 'Invalid role'}), 403
+        # Look up the role's handler for this method
+        handler = role_handlers[current_user.role].get(request.method)
+        if handler is None:
+            return jsonify({'error': 'Method not allowed'}), 405
+        # Report the request under the handler it reached, e.g. admin.get_tasks
+        label_endpoint('%s.%s' % (current_user.role.lower(), handler.__name__))
+
+    # Call the undecorated handler directly, passing the resolved user along
+    if request.method in task_id_methods:
+        if not var.isdigit():
+            return jsonify({'error': 'Task not found'}), 404
+        return handler.handler(current_user, int(var))
+    return handler.handler(current_user)
+
+# Bulk task handlers for each role
+bulk_handlers = {
+    'Admin': admin.bulk_tasks,
+    'Manager': manager.bulk_tasks,
+}
+
+# Bulk endpoint, dispatched by role in-process like /api/<var>
+@api_bp.route('/api/tasks/bulk', methods=['POST'])
+def route_bulk():
+    # Requires valid JWT token
+    with span('jwt'):
+        verify_jwt_in_request()
+    current_user = current_principal()
+    if current_user is None:
+        return jsonify({'error': 'Unauthorized'}), 401
+    handler = bulk_handlers.get(current_user.role)
+    if handler is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    label_endpoint('%s.%s' % (current_user.role.lower(), handler.__name__))
+    return handler.handler(current_user)
@@ -0,0 +1,118 @@
+# Archive Blueprint: Moves finished tasks out of the task table
+# Provides the `flask archive run` job, which moves tasks done for more than ARCHIVE_AFTER_DAYS
+# days into task_archive in small batches, each its own short transaction, so the write lock is
+# never held for long and other requests get it between batches
+
+import click
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import DateTime, and_, func, insert, literal, or_, select
+from blueprints.database.database import Task, TaskArchive, db, task_ids_reused
+from cache import bump_shared_version, tasks_changed
+
+# Initialize blueprint for archiving
+archive_bp = Blueprint('archive', __name__)
+
+
+def archivable(cutoff, done_statuses):
+    """
+    Clause matching finished tasks last changed before the cutoff.
+    """
+    return and_(Task.status.in_(done_statuses),
+                or_(Task.updated_at < cutoff, and_(Task.updated_at.is_(None), Task.created_at < cutoff)))
+
+
+def missing_task(task_id, owner_id=None):
+    """
+    Response to a write to a task that is not in the task table.
+    Args:
+        task_id: Id of the task
+        owner_id: Assignee the caller must be to learn the task was archived (None for any)
+    Returns:
+        Error message and 409 status code if the task was archived
+        Error message and 401 status code if it was archived but is not the caller's
+        Error message and 404 status code otherwise
+    """
+    archived = db.session.execute(select(TaskArchive.assigned_to).where(TaskArchive.id == task_id)).first()
+    if archived is None:
+        return jsonify({'message': 'Task not found'}), 404
+    if owner_id is not None and archived.assigned_to != owner_id:
+        return jsonify({'message': 'Unauthorized'}), 401
+    return jsonify({'message': 'Task is archived and can no longer be changed'}), 409
+
+
+def archive_batch(cutoff, done_statuses, batch_size):
+    """
+    Move one batch of archivable tasks to task_archive in one transaction.
+    Args:
+        cutoff: Tasks last changed before this time are archived
+        done_statuses: Statuses of finished tasks
+        batch_size: Largest number of tasks moved
+    Returns:
+        Number of tasks moved
+    """
+    matches = archivable(cutoff, done_statuses)
+    try:
+        # Lock the batch on PostgreSQL (skipping rows being written), so the copy and the delete
+        # below see the same rows; SQLite holds its write lock from the copy to the commit
+        candidates = db.session.execute(select(Task.id, Task.assigned_to).where(matches).order_by(Task.id)
+                                        .limit(batch_size).with_for_update(skip_locked=True)).all()
+        if not candidates:
+            db.session.rollback()
+            return 0
+        ids = [task_id for task_id, _ in candidates]
+        batch = and_(matches, Task.id.in_(ids))
+        columns = [column.name for column in Task.__table__.c]
+        db.session.execute(insert(TaskArchive).from_select(
+            columns + ['archived_at'],
+            select(*Task.__table__.c, literal(datetime.utcnow(), DateTime)).where(batch)))
+        moved = db.session.execute(Task.__table__.delete().where(batch)).rowcount
+        # The web workers' caches are in other processes, they see the move through the shared version
+        bump_shared_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Listings of the assignees change; the change feed reports the tasks as deleted
+    tasks_changed([assignee for _, assignee in candidates])
+    return moved
+
+
+@archive_bp.cli.command('run')
+@click.option('--days', type=int, help='Archive tasks done for more than this many days (default ARCHIVE_AFTER_DAYS)')
+@click.option('--batch-size', type=int, help='Tasks moved per transaction (default ARCHIVE_BATCH_SIZE)')
+@click.option('--pause', type=float, help='Seconds between batches (default ARCHIVE_BATCH_PAUSE)')
+@click.option('--limit', type=int, default=0, help='Stop after moving this many tasks (0 for no limit)')
+@click.option('--dry-run', is_flag=True, help='Only count the tasks that would be archived')
+def run(days, batch_size, pause, limit, dry_run):
+    """
+    Move finished tasks older than the given age from task to task_archive.
+    Meant to run periodically (e.g. nightly from cron); it can be stopped at any time,
+    every batch is moved completely or not at all.
+    """
+    config = current_app.config
+    days = config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    pause = config['ARCHIVE_BATCH_PAUSE'] if pause is None else pause
+    done = config['TASK_DONE_STATUSES']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    # A new task given an archived task's id could never be archived itself
+    if task_ids_reused():
+        raise click.ClickException('Task ids are reused on this database, run `flask database task-ids` first')
+    if dry_run:
+        count = db.session.execute(select(func.count()).select_from(Task).where(archivable(cutoff, done))).scalar()
+        db.session.rollback()
+        click.echo('%d tasks would be archived' % count)
+        return
+
+    total, started = 0, time.monotonic()
+    while not limit or total < limit:
+        moved = archive_batch(cutoff, done, min(batch_size, limit - total) if limit else batch_size)
+        if not moved:
+            break
+        total += moved
+        click.echo('Archived %d tasks' % total)
+        # Let waiting writers take the lock between batches
+        time.sleep(pause)
+    click.echo('Archived %d tasks in %.1f s' % (total, time.monotonic() - started))
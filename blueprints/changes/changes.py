@@ -0,0 +1,289 @@
+# Changes Blueprint: Change feed of task writes, scoped to the tasks each role can see
+# Provides delta queries and long-polling (GET /api/changes) and Server-Sent Events
+# (GET /api/changes/stream) over the task_event log, and a job pruning old events
+
+import click
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import and_, func, or_, select, text
+from blueprints.database.database import TASK_EVENT_POSTGRESQL_DDL, TASK_EVENT_SQLITE_DDL, Task, TaskEvent, db
+from change_feed import DISCONNECT_KEY, SubscriberLimit, get_notifier
+from roles import ROLES, role_required, scope_filter
+from serializers import TASK_FIELDS, row_serializer, task_columns
+from team_index import team_of
+
+# Initialize blueprint for the change feed
+changes_bp = Blueprint('changes', __name__)
+
+
+class EventsPruned(Exception):
+    """
+    Raised when the events after a client's position were already deleted.
+    """
+
+
+def latest_seq():
+    """
+    Return the sequence of the newest event, 0 when there is none.
+    """
+    return db.session.execute(select(func.max(TaskEvent.seq))).scalar() or 0
+
+
+def visible_assignees(user):
+    """
+    Assignees whose task changes a user is woken for, None for every task.
+    """
+    if user.role == 'Admin':
+        return None
+    if user.role == 'Manager':
+        return team_of(user.id)
+    return frozenset((user.id,))
+
+
+def read_events(user, since, limit):
+    """
+    Read the events after a sequence that concern the user.
+    An event concerns the user if its task was visible to them before or after the change.
+    The task is included in its current state, or as None for deletes and tasks deleted
+    or no longer visible to the user since.
+    Args:
+        user: Authenticated user resolved by role_required
+        since: Sequence of the last event the client has seen
+        limit: Largest number of events to return
+    Returns:
+        List of event dicts and the sequence to resume from
+    Raises:
+        EventsPruned: If events after since were already deleted
+    """
+    oldest, newest = db.session.execute(select(func.min(TaskEvent.seq), func.max(TaskEvent.seq))).one()
+    if newest is None or since >= newest:
+        return [], max(since, newest or 0)
+    if since < oldest - 1:
+        raise EventsPruned('Events after %d were pruned' % since)
+
+    # Only events up to newest, so the resume position never skips one committed meanwhile
+    query = select(*task_columns(TASK_FIELDS), TaskEvent.seq, TaskEvent.task_id, TaskEvent.action).where(
+        TaskEvent.seq > since, TaskEvent.seq <= newest)
+    visible = scope_filter(user, Task.assigned_to)
+    if visible is None:
+        joined = Task.id == TaskEvent.task_id
+    else:
+        joined = and_(Task.id == TaskEvent.task_id, visible)
+        query = query.where(or_(scope_filter(user, TaskEvent.assigned_to),
+                                scope_filter(user, TaskEvent.previous_assignee)))
+    rows = db.session.execute(query.outerjoin_from(TaskEvent, Task, joined)
+                              .order_by(TaskEvent.seq).limit(limit + 1)).all()
+    serialize = row_serializer(TASK_FIELDS)
+    events = [{'seq': row.seq, 'task_id': row.task_id, 'action': row.action,
+               # SQLite can give a deleted task's id to a new task, never show it on a delete
+               'task': serialize(row) if row.id is not None and row.action != 'deleted' else None}
+              for row in rows[:limit]]
+    # A full page resumes after its last event, otherwise after everything read
+    return events, events[-1]['seq'] if len(rows) > limit else newest
+
+
+def wait_for_events(user, since, limit, timeout):
+    """
+    Read events after since, waiting up to timeout seconds for the first one.
+    The database connection is released while waiting, and the wait ends early if the
+    client disconnects.
+    """
+    poll_interval = current_app.config['CHANGE_FEED_POLL_INTERVAL']
+    disconnect = request.environ.get(DISCONNECT_KEY)
+    notifier = get_notifier()
+    with notifier.subscribe(visible_assignees(user), current_app.config['CHANGE_FEED_MAX_SUBSCRIBERS']) as ready:
+        if disconnect is not None:
+            disconnect.on_set(ready.set)
+        # Read after subscribing, so a write committed in between still wakes us
+        events, since = read_events(user, since, limit)
+        deadline = time.monotonic() + timeout
+        while not events and time.monotonic() < deadline:
+            if disconnect is not None and disconnect.is_set():
+                break
+            db.session.close()
+            remaining = deadline - time.monotonic()
+            if not ready.wait(min(remaining, poll_interval) if poll_interval else remaining):
+                # Writes of other processes do not wake us, look for them now and then
+                if poll_interval:
+                    notifier.check(latest_seq, poll_interval)
+                if not ready.is_set():
+                    continue
+            ready.clear()
+            events, since = read_events(user, since, limit)
+    return events, since
+
+
+def parse_since(value):
+    """
+    Parse a feed position.
+    Raises:
+        ValueError: If it is not a sequence number
+    """
+    try:
+        since = int(value)
+    except ValueError:
+        raise ValueError('since must be an integer')
+    if since < 0:
+        raise ValueError('since must not be negative')
+    return since
+
+
+@changes_bp.route('/api/changes', methods=['GET'])
+@role_required(*ROLES)  # Every role, scoped to what it can see
+def get_changes(user):
+    """
+    Return task changes after ?since=<seq>, waiting up to ?wait=<seconds> for one if there is none.
+    Without since, returns no events and the current sequence to start from.
+    Args:
+        user: Authenticated user resolved by role_required
+    Returns:
+        JSON with the events and the sequence to pass as since next time, and 200 status code
+        Error message and 400 status code for invalid parameters
+        Error message and 410 status code if the events after since were pruned
+        Error message and 503 status code if too many clients are waiting
+        Error message and 500 status code on failure
+    """
+    try:
+        if 'since' not in request.args:
+            return jsonify({'events': [], 'seq': latest_seq()}), 200
+        try:
+            since = parse_since(request.args['since'])
+            limit = int(request.args.get('limit', current_app.config['CHANGE_FEED_PAGE_LIMIT']))
+            wait = float(request.args.get('wait', 0))
+        except ValueError as e:
+            return jsonify({'message': 'Invalid query parameters', 'error': str(e)}), 400
+        if limit <= 0:
+            return jsonify({'message': 'Invalid query parameters', 'error': 'limit must be a positive integer'}), 400
+        limit = min(limit, current_app.config['TASK_PAGE_MAX_LIMIT'])
+        wait = min(max(wait, 0), current_app.config['CHANGE_FEED_MAX_WAIT'])
+        try:
+            if wait:
+                events, seq = wait_for_events(user, since, limit, wait)
+            else:
+                events, seq = read_events(user, since, limit)
+        except EventsPruned as e:
+            # The client missed events and must reload its tasks, then follow from seq
+            return jsonify({'message': 'Reload tasks', 'error': str(e), 'seq': latest_seq()}), 410
+        except SubscriberLimit:
+            return jsonify({'message': 'Too many waiting clients, retry later'}), 503
+        return jsonify({'events': events, 'seq': seq}), 200
+    except Exception as e:
+        # Log error and return 500 response
+        return jsonify({'message': 'Failed to retrieve changes', 'error': print(e)}), 500
+
+
+@changes_bp.route('/api/changes/stream', methods=['GET'])
+@role_required(*ROLES)  # Every role, scoped to what it can see
+def stream_changes(user):
+    """
+    Stream task changes as Server-Sent Events, starting after the Last-Event-ID header or
+    ?since=<seq> (from now if neither is given). The stream ends after
+    CHANGE_FEED_STREAM_SECONDS; clients reconnect with the last event id they received.
+    Args:
+        user: Authenticated user resolved by role_required
+    Returns:
+        text/event-stream response and 200 status code
+        Error message and 400 status code for an invalid position
+        Error message and 410 status code if the events after it were pruned
+        Error message and 503 status code if too many clients are waiting
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = latest_seq() if since is None else parse_since(since)
+        # Fail before the stream starts if the client fell behind
+        read_events(user, since, 1)
+    except ValueError as e:
+        return jsonify({'message': 'Invalid position', 'error': str(e)}), 400
+    except EventsPruned as e:
+        return jsonify({'message': 'Reload tasks', 'error': str(e), 'seq': latest_seq()}), 410
+    config = current_app.config
+    notifier = get_notifier()
+    # Take the subscriber slot before the stream starts, so that a full feed answers 503; the
+    # slot is given back when the server closes the response
+    try:
+        waiter = notifier.add(visible_assignees(user), config['CHANGE_FEED_MAX_SUBSCRIBERS'])
+    except SubscriberLimit:
+        return jsonify({'message': 'Too many waiting clients, retry later'}), 503
+    ready = waiter[1]
+    limit = config['CHANGE_FEED_PAGE_LIMIT']
+    dumps = current_app.json.dumps
+    disconnect = request.environ.get(DISCONNECT_KEY)
+
+    def generate(since):
+        # Tell the client how soon to reconnect when the stream ends
+        yield 'retry: 1000\n\n'
+        try:
+            # Stop waiting as soon as the client goes away, freeing the server thread
+            if disconnect is not None:
+                disconnect.on_set(ready.set)
+            deadline = time.monotonic() + config['CHANGE_FEED_STREAM_SECONDS']
+            keepalive = config['CHANGE_FEED_KEEPALIVE']
+            poll_interval = config['CHANGE_FEED_POLL_INTERVAL']
+            idle_since = time.monotonic()
+            while time.monotonic() < deadline:
+                if disconnect is not None and disconnect.is_set():
+                    return
+                ready.clear()
+                events, position = read_events(user, since, limit)
+                chunks = ['id: %d\nevent: task\ndata: %s\n\n' % (event['seq'], dumps(event)) for event in events]
+                if position > since and (not events or position > events[-1]['seq']):
+                    # Move the client's last event id past events it cannot see
+                    chunks.append('id: %d\n\n' % position)
+                since = position
+                if chunks:
+                    yield ''.join(chunks)
+                    idle_since = time.monotonic()
+                    if len(events) == limit:
+                        continue
+                # Release the connection until something changes
+                db.session.close()
+                timeout = min(deadline - time.monotonic(), poll_interval or keepalive, keepalive)
+                if not ready.wait(max(timeout, 0)):
+                    if poll_interval:
+                        notifier.check(latest_seq, poll_interval)
+                    if time.monotonic() - idle_since >= keepalive:
+                        # Comment line keeping proxies from closing an idle stream
+                        yield ': keepalive\n\n'
+                        idle_since = time.monotonic()
+        except EventsPruned:
+            # End the stream, the client reconnects and gets a 410
+            return
+
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream')
+    response.call_on_close(lambda: notifier.remove(waiter))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response, 200
+
+
+@changes_bp.cli.command('prune')
+@click.option('--days', type=int, default=7, show_default=True, help='Keep events newer than this many days')
+def prune(days):
+    """
+    Delete change feed events older than the given number of days (e.g. from cron).
+    The newest event is always kept so sequences carry on; clients behind the pruned
+    events get a 410 and reload their tasks.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    newest = latest_seq()
+    deleted = db.session.execute(TaskEvent.__table__.delete().where(
+        TaskEvent.created_at < cutoff, TaskEvent.seq < newest)).rowcount
+    db.session.commit()
+    click.echo('Deleted %d events' % deleted)
+
+
+@changes_bp.cli.command('install')
+def install():
+    """
+    Create the task_event table and its triggers on an existing database.
+    The table may already exist (e.g. created by `flask db upgrade`), which does not fire its
+    after_create triggers, so they are always created here.
+    """
+    TaskEvent.__table__.create(db.engine, checkfirst=True)
+    statements = {'sqlite': TASK_EVENT_SQLITE_DDL, 'postgresql': TASK_EVENT_POSTGRESQL_DDL}
+    for statement in statements.get(db.engine.dialect.name, ()):
+        db.session.execute(text(statement))
+    db.session.commit()
+    click.echo('Change feed installed')
@@ -1,31 +1,289 @@
 # Database module: Defines database models and initializes SQLAlchemy
 
+import click
+import sqlite3
 from flask import Blueprint
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, text
+from sqlalchemy.schema import CreateTable
 import datetime
-from config import app
 
 # Initialize blueprint for database operations
 database_bp = Blueprint('database', __name__)
 
-# Initialize SQLAlchemy with Flask app
-db = SQLAlchemy(app)
+# Initialize SQLAlchemy, bound to the app by init_db
+db = SQLAlchemy()
+
+def sqlite_profile(config):
+    """
+    Build the connect listener applying the SQLite profile from config to every new SQLite connection.
+    """
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=' + config['SQLITE_JOURNAL_MODE'])
+        cursor.execute('PRAGMA synchronous=' + config['SQLITE_SYNCHRONOUS'])
+        cursor.execute('PRAGMA busy_timeout=%d' % config['SQLITE_BUSY_TIMEOUT'])
+        cursor.execute('PRAGMA mmap_size=%d' % config['SQLITE_MMAP_SIZE'])
+        cursor.close()
+    return set_sqlite_pragmas
+
+def init_db(app):
+    """
+    Bind SQLAlchemy to the app; its engines are created here but connect on first use.
+    """
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'connect', sqlite_profile(app.config))
 
 # Define User model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     username = db.Column(db.String(80), unique=True, nullable=False)  # Unique username
-    password = db.Column(db.String(120), nullable=False)  # User password
+    password = db.Column(db.String(255), nullable=False)  # User password hash, up to 166 characters with scrypt or pbkdf2:sha512
     role = db.Column(db.String(20), nullable=False)  # User role (e.g., Admin, Manager, User)
-    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Self-referential foreign key for manager
+    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)  # Self-referential foreign key for manager, indexed for team lookups
 
 # Define Task model
 class Task(db.Model):
+    __table_args__ = (
+        db.Index('ix_task_assigned_to_status', 'assigned_to', 'status'),  # Assignee and status filters
+        # Never reuse the id of a deleted or archived task
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     title = db.Column(db.String(120), nullable=False)  # Task title
     description = db.Column(db.String, nullable=False)  # Task description
     status = db.Column(db.String(20), default='Not Started')  # Task status with default value
     assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Foreign key to User model
+    due_date = db.Column(db.Date, nullable=False, index=True)  # Task due date, indexed for keyset pagination
+    created_at = db.Column(db.DATETIME, default=datetime.datetime.utcnow, index=True)  # Timestamp for task creation
+    updated_at = db.Column(db.DATETIME, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)  # Timestamp for last update, maintained on every update
+
+# Archived tasks: finished tasks moved out of task by `flask archive run`, so listings and team
+# queries only scan current work; listings include them with ?include_archived=1
+class TaskArchive(db.Model):
+    __tablename__ = 'task_archive'
+    __table_args__ = (
+        db.Index('ix_task_archive_assigned_to', 'assigned_to'),  # Scoped listings
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # Id the task had in task
+    title = db.Column(db.String(120), nullable=False)  # Task title
+    description = db.Column(db.String, nullable=False)  # Task description
+    status = db.Column(db.String(20))  # Task status when archived
+    assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Foreign key to User model
     due_date = db.Column(db.Date, nullable=False)  # Task due date
-    created_at = db.Column(db.DATETIME, default=datetime.datetime.utcnow)  # Timestamp for task creation
-    updated_at = db.Column(db.DATETIME, default=datetime.datetime.utcnow)  # Timestamp for last update
\ No newline at end of file
+    created_at = db.Column(db.DATETIME)  # Timestamp for task creation
+    updated_at = db.Column(db.DATETIME)  # Timestamp for the last update before archiving
+    archived_at = db.Column(db.DATETIME, nullable=False, index=True)  # Timestamp of the move
+
+# Versions of data changed outside the web workers (e.g. tasks moved by the archive job), which
+# every worker polls so that its in-memory caches drop what the change made stale
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(50), primary_key=True)  # What changed, e.g. 'tasks'
+    version = db.Column(db.Integer, nullable=False)  # Bumped on every change
+
+# Full-text index over task titles and descriptions (SQLite FTS5), kept in sync by triggers
+TASK_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(title, description, content='task', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+)
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Alembic autogenerate filter: skip the search index and its FTS5 shadow tables, which are
+    created by the DDL above rather than by a model, so `flask db migrate` never drops them.
+    """
+    return not (type_ == 'table' and name.startswith('task_fts'))
+
+# Create the search index alongside the task table, and drop it with the table
+for statement in TASK_FTS_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Task.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS task_fts').execute_if(dialect='sqlite'))
+
+# Task counts per (assignee, status, due month), kept current by triggers on task in the same
+# transaction as every write; unassigned tasks and missing statuses are stored as 0 and ''
+class TaskStat(db.Model):
+    __tablename__ = 'task_stat'
+
+    assigned_to = db.Column(db.Integer, primary_key=True)  # Assignee id, 0 when unassigned
+    status = db.Column(db.String(20), primary_key=True)  # Task status, '' when missing
+    due_month = db.Column(db.Date, primary_key=True)  # First day of the due month, so overdue counts follow the calendar
+    tasks = db.Column(db.Integer, nullable=False)  # Number of tasks with these values
+
+# The triggers are created with the summary table, which must come after task
+TaskStat.__table__.add_is_dependent_on(Task.__table__)
+
+# Summary maintenance for SQLite: take a task out of its old group and add it to its new one
+_TASK_STAT_REMOVE = (
+    "UPDATE task_stat SET tasks = tasks - 1 WHERE assigned_to = coalesce(old.assigned_to, 0) "
+    "AND status = coalesce(old.status, '') AND due_month = {old_month}; "
+    "DELETE FROM task_stat WHERE assigned_to = coalesce(old.assigned_to, 0) "
+    "AND status = coalesce(old.status, '') AND due_month = {old_month} AND tasks <= 0; "
+)
+_TASK_STAT_ADD = (
+    "INSERT INTO task_stat(assigned_to, status, due_month, tasks) "
+    "VALUES (coalesce(new.assigned_to, 0), coalesce(new.status, ''), {new_month}, 1) "
+    "ON CONFLICT(assigned_to, status, due_month) DO UPDATE SET tasks = {table}tasks + 1; "
+)
+_SQLITE_REMOVE = _TASK_STAT_REMOVE.format(old_month="date(old.due_date, 'start of month')")
+_SQLITE_ADD = _TASK_STAT_ADD.format(new_month="date(new.due_date, 'start of month')", table='')
+TASK_STAT_SQLITE_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS task_stat_insert AFTER INSERT ON task BEGIN " + _SQLITE_ADD + "END",
+    "CREATE TRIGGER IF NOT EXISTS task_stat_delete AFTER DELETE ON task BEGIN " + _SQLITE_REMOVE + "END",
+    "CREATE TRIGGER IF NOT EXISTS task_stat_update AFTER UPDATE OF assigned_to, status, due_date ON task "
+    "WHEN old.assigned_to IS NOT new.assigned_to OR old.status IS NOT new.status OR old.due_date IS NOT new.due_date "
+    "BEGIN " + _SQLITE_REMOVE + _SQLITE_ADD + "END",
+)
+
+# Summary maintenance for PostgreSQL, one trigger function for every kind of write
+TASK_STAT_POSTGRESQL_DDL = (
+    "CREATE OR REPLACE FUNCTION task_stat_apply() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+    + _TASK_STAT_REMOVE.replace('old.', 'OLD.').format(old_month="date_trunc('month', OLD.due_date)::date") +
+    "END IF; "
+    "IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+    + _TASK_STAT_ADD.replace('new.', 'NEW.').format(new_month="date_trunc('month', NEW.due_date)::date",
+                                                    table='task_stat.') +
+    "END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS task_stat_insert_delete ON task",
+    "CREATE TRIGGER task_stat_insert_delete AFTER INSERT OR DELETE ON task "
+    "FOR EACH ROW EXECUTE FUNCTION task_stat_apply()",
+    "DROP TRIGGER IF EXISTS task_stat_update ON task",
+    "CREATE TRIGGER task_stat_update AFTER UPDATE OF assigned_to, status, due_date ON task FOR EACH ROW "
+    "WHEN (OLD.assigned_to IS DISTINCT FROM NEW.assigned_to OR OLD.status IS DISTINCT FROM NEW.status "
+    "OR OLD.due_date IS DISTINCT FROM NEW.due_date) EXECUTE FUNCTION task_stat_apply()",
+)
+
+# Create the triggers along with the summary table
+for statement in TASK_STAT_SQLITE_DDL:
+    event.listen(TaskStat.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in TASK_STAT_POSTGRESQL_DDL:
+    event.listen(TaskStat.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+# Change feed: one row per task insert, update and delete, written by triggers in the same
+# transaction. seq numbers events in commit order, so `seq > N` is exactly what came after N
+class TaskEvent(db.Model):
+    __tablename__ = 'task_event'
+    # Never reuse the seq of pruned events
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)  # Position in the feed
+    task_id = db.Column(db.Integer, nullable=False)  # Changed task, possibly deleted since
+    action = db.Column(db.String(10), nullable=False)  # 'created', 'updated' or 'deleted'
+    assigned_to = db.Column(db.Integer)  # Assignee after the change, None for deletes
+    previous_assignee = db.Column(db.Integer)  # Assignee before an update or delete
+    created_at = db.Column(db.DATETIME, nullable=False)  # Time of the change
+
+# The triggers are created with the event table, which must come after task
+TaskEvent.__table__.add_is_dependent_on(Task.__table__)
+
+_TASK_EVENT_INSERT = ("INSERT INTO task_event(task_id, action, assigned_to, previous_assignee, created_at) "
+                      "VALUES ({values}, CURRENT_TIMESTAMP); ")
+TASK_EVENT_SQLITE_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS task_event_insert AFTER INSERT ON task BEGIN "
+    + _TASK_EVENT_INSERT.format(values="new.id, 'created', new.assigned_to, NULL") + "END",
+    "CREATE TRIGGER IF NOT EXISTS task_event_update AFTER UPDATE ON task BEGIN "
+    + _TASK_EVENT_INSERT.format(values="new.id, 'updated', new.assigned_to, old.assigned_to") + "END",
+    "CREATE TRIGGER IF NOT EXISTS task_event_delete AFTER DELETE ON task BEGIN "
+    + _TASK_EVENT_INSERT.format(values="old.id, 'deleted', NULL, old.assigned_to") + "END",
+)
+
+# On PostgreSQL sequence values are taken before commit, so concurrent writers could commit
+# seq 6 before seq 5 and a reader at 6 would never see 5; a transaction lock keeps task
+# writers in seq order
+TASK_EVENT_POSTGRESQL_DDL = (
+    "CREATE OR REPLACE FUNCTION task_event_record() RETURNS trigger AS $$ BEGIN "
+    "PERFORM pg_advisory_xact_lock(hashtext('task_event')); "
+    "IF TG_OP = 'INSERT' THEN "
+    + _TASK_EVENT_INSERT.format(values="NEW.id, 'created', NEW.assigned_to, NULL") +
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    + _TASK_EVENT_INSERT.format(values="NEW.id, 'updated', NEW.assigned_to, OLD.assigned_to") +
+    "ELSE "
+    + _TASK_EVENT_INSERT.format(values="OLD.id, 'deleted', NULL, OLD.assigned_to") +
+    "END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS task_event_record ON task",
+    "CREATE TRIGGER task_event_record AFTER INSERT OR UPDATE OR DELETE ON task "
+    "FOR EACH ROW EXECUTE FUNCTION task_event_record()",
+)
+
+# Create the triggers along with the event table
+for statement in TASK_EVENT_SQLITE_DDL:
+    event.listen(TaskEvent.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in TASK_EVENT_POSTGRESQL_DDL:
+    event.listen(TaskEvent.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+@database_bp.cli.command('search-index')
+def search_index():
+    """
+    Create the task full-text index on an existing SQLite database and rebuild its contents.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Full-text index is only used on SQLite')
+        return
+    for statement in TASK_FTS_DDL:
+        db.session.execute(text(statement))
+    db.session.execute(text("INSERT INTO task_fts(task_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    click.echo('Task search index rebuilt')
+def task_ids_reused():
+    """
+    Return whether the ids of archived or deleted tasks can be given to new tasks, as on SQLite
+    task tables created before task ids were AUTOINCREMENT (see `flask database task-ids`).
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    sql = db.session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'task'")).scalar()
+    return sql is not None and 'AUTOINCREMENT' not in sql.upper()
+
+@database_bp.cli.command('task-ids')
+def task_ids():
+    """
+    Rebuild a SQLite task table created before task ids were AUTOINCREMENT, so the ids of archived
+    and deleted tasks are never given to new tasks. Stop the app while it runs.
+    """
+    if not task_ids_reused():
+        click.echo('Task ids are already never reused')
+        return
+    connection = db.session.connection()
+    existing = {name for name, in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    # Indexes and triggers go with the old table, keep their definitions to create them again
+    dependents = [sql for sql, in connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'task' AND type IN ('index', 'trigger') AND sql IS NOT NULL"))]
+    create = str(CreateTable(Task.__table__).compile(dialect=connection.dialect))
+    columns = ', '.join(column.name for column in Task.__table__.c)
+    try:
+        # One transaction, so a failure leaves the old table in place
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+        connection.exec_driver_sql(create.replace('CREATE TABLE task (', 'CREATE TABLE task_new (', 1))
+        connection.exec_driver_sql('INSERT INTO task_new (%s) SELECT %s FROM task' % (columns, columns))
+        connection.exec_driver_sql('DROP TABLE task')
+        connection.exec_driver_sql('ALTER TABLE task_new RENAME TO task')
+        for sql in dependents:
+            connection.exec_driver_sql(sql)
+        # Continue after every id handed out so far, including archived tasks and deleted ones
+        # the change feed recorded
+        used = [('task', 'id'), ('task_archive', 'id'), ('task_event', 'task_id')]
+        highest = max(connection.execute(text('SELECT MAX(%s) FROM %s' % (column, table))).scalar() or 0
+                      for table, column in used if table in existing)
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'task'"))
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('task', :seq)"), {'seq': highest})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo('Task ids are no longer reused')
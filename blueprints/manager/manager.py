@@ -2,36 +2,39 @@
 # Provides endpoints for creating, viewing, updating, and deleting tasks
 
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from blueprints.database.database import User, Task, db
+from blueprints.database.database import Task, db
+from blueprints.archive.archive import missing_task
 from datetime import datetime
+from bulk import BulkError, run_bulk
+from cache import tasks_changed
+from listing import task_listing
 from roles import role_required
+from team_index import manages, team_of
 
 # Initialize blueprint for manager operations
 manager_bp = Blueprint('manager', __name__)
 
 @manager_bp.route('/tasks', methods=['POST'])
-@jwt_required()  # Require valid JWT token
 @role_required('Manager')  # Restrict to Manager role
-def create_task():
+def create_task(user):
     """
     Create a new task assigned to a user managed by the current manager.
+    Args:
+        user: Authenticated user resolved by role_required
     Returns:
         JSON message and 200 status code on success
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         # Get request data
         data = request.get_json()
 
         if user.role == 'Manager':
-            # Verify assignee exists and is managed by current manager
-            assignee = User.query.filter_by(id=data['assigned_to'], manager_id=user.id).first()
+            # Verify assignee exists and is managed by current manager, from the team index
+            assignee_id = int(data['assigned_to'])
 
             # Return 404 if assignee not found or not under this manager
-            if not assignee:
+            if not manages(user.id, assignee_id):
                 return jsonify({'message': 'Assignee not found'}), 404
             
             # Create new task with validated data
@@ -39,64 +42,57 @@ def create_task():
                 title=data['title'],
                 description=data['description'],
                 due_date=datetime.strptime(data['due_date'], '%d-%m-%y'),
-                assigned_to=assignee.id  # ID of user assigned to task
+                assigned_to=assignee_id  # ID of user assigned to task
             )
             # Add and commit new task to database
             db.session.add(new_task)
             db.session.commit()
+            # Invalidate cached listings that include the task
+            tasks_changed([new_task.assigned_to])
             return jsonify({'message': 'Task created'}), 200
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to create task', 'error': print(e)}), 500
 
 @manager_bp.route('/tasks', methods=['GET'])
-@jwt_required()  # Require valid JWT token
 @role_required('Manager')  # Restrict to Manager role
-def get_tasks():
+def get_tasks(user):
     """
     Retrieve all tasks created by the current manager.
+    Args:
+        user: Authenticated user resolved by role_required
     Returns:
         JSON array of tasks and 200 status code on success
         Error message and 500 status code on failure
     """
     try:
-        # Get current manager from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         if user.role == 'Manager':
-            # Query tasks assigned by the current manager
-            tasks = Task.query.join(User, Task.assigned_to == User.id).filter(User.manager_id == user.id).all()
-            # Format tasks for JSON response
-            return jsonify([{
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'status': task.status,
-                    'due_date': task.due_date.strftime('%Y-%m-%d'),
-                    'assigned_to': task.assigned_to
-                } for task in tasks]), 200
+            # Query tasks assigned to the manager's team, paginated and projected from the query string
+            return task_listing(Task.query.filter(Task.assigned_to.in_(team_of(user.id))), 'manager:%d' % user.id)
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to retrieve tasks', 'error': print(e)}), 500
 
 @manager_bp.route('/tasks/<int:task_id>', methods=['PUT'])
-@jwt_required()  # Require valid JWT token
 @role_required('Manager')  # Restrict to Manager role
-def update_task(task_id):
+def update_task(user, task_id):
     """
     Update a specific task assigned to the manager.
     Args:
+        user: Authenticated user resolved by role_required
         task_id: Integer ID of the task to update
     Returns:
         JSON message and 200 status code on success
+        Error message and 404 status code if the task does not exist, 409 if it was archived
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         # Get request data
         data = request.get_json()
         # Find task by ID
         task = Task.query.filter_by(id=task_id).first()
+        if task is None:
+            return missing_task(task_id, user.id)
 
         # Verify user is Manager and owns the task
         if user.role == 'Manager' and task.assigned_to == user.id:
@@ -106,6 +102,8 @@ def update_task(task_id):
             task.due_date = datetime.strptime(data['due_date'], '%d-%m-%y')
             # Save changes to database
             db.session.commit()
+            # Invalidate cached listings that include the task
+            tasks_changed([task.assigned_to])
             return jsonify({'message': 'Task updated'}), 200
         else:
             # Return unauthorized if validation fails
@@ -115,32 +113,65 @@ def update_task(task_id):
         return jsonify({'message': 'Failed to update task', 'error': print(e)}), 500
 
 @manager_bp.route('/tasks/<int:task_id>', methods=['DELETE'])
-@jwt_required()  # Require valid JWT token
 @role_required('Manager')  # Restrict to Manager role
-def delete_task(task_id):
+def delete_task(user, task_id):
     """
     Delete a specific task assigned to the manager.
     Args:
+        user: Authenticated user resolved by role_required
         task_id: Integer ID of the task to delete
     Returns:
         JSON message and 200 status code on success
+        Error message and 404 status code if the task does not exist, 409 if it was archived
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
         # Find task by ID
         task = Task.query.filter_by(id=task_id).first()
+        if task is None:
+            return missing_task(task_id, user.id)
 
         # Verify user is Manager and owns the task
         if user.role == 'Manager' and task.assigned_to == user.id:
             # Remove task from database
             db.session.delete(task)
             db.session.commit()
+            # Invalidate cached listings that included the task
+            tasks_changed([task.assigned_to])
             return jsonify({'message': 'Task deleted'}), 200
         else:
             # Return unauthorized if validation fails
             return jsonify({'message': 'Unauthorized'}), 401
     except Exception as e:
         # Log error and return 500 response
-        return jsonify({'message': 'Failed to delete task', 'error': print(e)}), 500
\ No newline at end of file
+        return jsonify({'message': 'Failed to delete task', 'error': print(e)}), 500
+
+@manager_bp.route('/tasks/bulk', methods=['POST'])
+@role_required('Manager')  # Restrict to Manager role
+def bulk_tasks(user):
+    """
+    Create, update and delete tasks in one batch, for users managed by the current manager.
+    Args:
+        user: Authenticated user resolved by role_required
+    Returns:
+        JSON per-item results and 200 status code on success
+        JSON per-item results and 400 status code if any item is invalid (nothing is written)
+        Error message and 500 status code on failure
+    """
+    try:
+        # Get request data
+        data = request.get_json()
+        # Assignees must be managed by the current manager, checked against the team index
+        def assignable(user_ids):
+            return {user_id for user_id in user_ids if manages(user.id, user_id)}
+
+        # Apply the whole batch, updating and deleting only tasks the manager owns
+        results = run_bulk(data, update_fields=('title', 'description', 'due_date'),
+                           assignable=assignable, owner_id=user.id)
+        return jsonify({'message': 'Batch applied', 'results': results}), 200
+    except BulkError as e:
+        # Return the per-item validation results
+        return jsonify({'message': 'Invalid batch', 'results': e.results}), 400
+    except Exception as e:
+        # Log error and return 500 response
+        return jsonify({'message': 'Failed to apply batch', 'error': print(e)}), 500
\ No newline at end of file
@@ -0,0 +1,76 @@
+# Metrics Blueprint: Exposes request instrumentation, registered when METRICS_ENABLED is set
+# Provides the Prometheus /metrics endpoint and the admin-only sampling profiler toggle
+
+from flask import Blueprint, Response, current_app, jsonify, request
+import instrumentation
+from instrumentation import finish_request, install_sql_hooks, profiler, registry, start_request
+from roles import role_required
+
+# Initialize blueprint for metrics
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.record_once
+def enable_instrumentation(state):
+    # Turn spans on and start counting SQL statements once the blueprint is registered
+    instrumentation.enabled = True
+    install_sql_hooks()
+
+
+# Time every request of the app, not only this blueprint's
+metrics_bp.before_app_request(start_request)
+metrics_bp.after_app_request(finish_request)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Return the collected metrics.
+    Returns:
+        Prometheus text exposition and 200 status code
+    """
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4'), 200
+
+@metrics_bp.route('/metrics/profiler', methods=['POST'])
+@role_required('Admin')  # Restrict to Admin role
+def toggle_profiler(user):
+    """
+    Start or stop the sampling profiler.
+    Args:
+        user: Authenticated user resolved by role_required
+    Request body:
+        enabled: true to start sampling (clearing earlier samples), false to stop
+        interval: Optional seconds between samples (defaults to METRICS_PROFILER_INTERVAL)
+    Returns:
+        Profiler state and 200 status code on success
+        Error message and 400 status code for an invalid body
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('enabled'), bool):
+        return jsonify({'message': 'enabled must be true or false'}), 400
+    if data['enabled']:
+        try:
+            interval = float(data.get('interval', current_app.config['METRICS_PROFILER_INTERVAL']))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'interval must be a number'}), 400
+        if interval <= 0:
+            return jsonify({'message': 'interval must be positive'}), 400
+        profiler.start(interval)
+    else:
+        profiler.stop()
+    return jsonify({'running': profiler.running, 'interval': profiler.interval,
+                    'samples': sum(profiler.samples.values())}), 200
+
+@metrics_bp.route('/metrics/profiler', methods=['GET'])
+@role_required('Admin')  # Restrict to Admin role
+def profile(user):
+    """
+    Return the stacks sampled since the profiler was last started.
+    Args:
+        user: Authenticated user resolved by role_required
+    Query parameters:
+        top: Number of most frequent stacks to return (default 100)
+    Returns:
+        Collapsed stacks ('frame;frame count' per line, for flamegraph tools) and 200 status code
+    """
+    top = request.args.get('top', 100, type=int)
+    return Response(profiler.collapsed(top), mimetype='text/plain'), 200
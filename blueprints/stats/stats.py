@@ -0,0 +1,126 @@
+# Stats Blueprint: Serves task aggregates per role scope from the task_stat summary table
+# Provides the statistics endpoint and the job reconciling the summary table with Task
+
+import click
+from datetime import date
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import func, or_, select, text
+from blueprints.database.database import TASK_STAT_POSTGRESQL_DDL, TASK_STAT_SQLITE_DDL, Task, TaskStat, db
+from roles import ROLES, role_required, scope_filter
+
+# Initialize blueprint for statistics
+stats_bp = Blueprint('stats', __name__)
+
+
+def summarise(rows, overdue_now, done_statuses):
+    """
+    Fold summary rows into the response document.
+    Args:
+        rows: (assignee, status, due before this month, tasks) rows from task_stat
+        overdue_now: Dict of assignee to open tasks due earlier this month
+        done_statuses: Statuses of finished tasks
+    """
+    result = {'total': 0, 'open': 0, 'overdue': 0, 'by_status': {}, 'by_assignee': {}}
+    for assigned_to, status, past, tasks in rows:
+        is_open = status not in done_statuses
+        assignee = result['by_assignee'].setdefault(assigned_to, {'total': 0, 'open': 0, 'overdue': 0})
+        for totals in (result, assignee):
+            totals['total'] += tasks
+            totals['open'] += tasks if is_open else 0
+            totals['overdue'] += tasks if is_open and past else 0
+        result['by_status'][status] = result['by_status'].get(status, 0) + tasks
+    for assigned_to, tasks in overdue_now.items():
+        result['overdue'] += tasks
+        result['by_assignee'].setdefault(assigned_to, {'total': 0, 'open': 0, 'overdue': 0})['overdue'] += tasks
+    # JSON object keys are strings, list assignees instead
+    result['by_assignee'] = [dict(totals, assigned_to=assigned_to or None)
+                             for assigned_to, totals in sorted(result['by_assignee'].items())]
+    return result
+
+@stats_bp.route('/api/stats', methods=['GET'])
+@role_required(*ROLES)  # Every role, scoped to what it can see
+def get_stats(user):
+    """
+    Return task counts for the caller's scope: everything for admins, the team for managers,
+    own tasks for users.
+    Args:
+        user: Authenticated user resolved by role_required
+    Returns:
+        JSON with total, open and overdue counts, counts by status and per-assignee workload,
+        and 200 status code on success
+        Error message and 500 status code on failure
+    """
+    try:
+        done = current_app.config['TASK_DONE_STATUSES']
+        today = date.today()
+        month = today.replace(day=1)
+        # Open tasks of earlier months are overdue, counted from the summary table
+        past = (TaskStat.due_month < month).label('past')
+        summary = select(TaskStat.assigned_to, TaskStat.status, past, func.sum(TaskStat.tasks)).group_by(
+            TaskStat.assigned_to, TaskStat.status, past)
+        # Open tasks due earlier this month are counted live, a range scan of the due date index
+        current = select(func.coalesce(Task.assigned_to, 0), func.count()).where(
+            Task.due_date >= month, Task.due_date < today,
+            or_(Task.status.is_(None), Task.status.notin_(done))).group_by(Task.assigned_to)
+        scope = scope_filter(user, TaskStat.assigned_to)
+        if scope is not None:
+            summary = summary.where(scope)
+            current = current.where(scope_filter(user, Task.assigned_to))
+        overdue_now = {}
+        for assigned_to, tasks in db.session.execute(current):
+            overdue_now[assigned_to] = overdue_now.get(assigned_to, 0) + tasks
+        return jsonify(summarise(db.session.execute(summary), overdue_now, done)), 200
+    except Exception as e:
+        # Log error and return 500 response
+        return jsonify({'message': 'Failed to retrieve stats', 'error': print(e)}), 500
+
+
+def count_tasks():
+    """
+    Count tasks per summary key straight from Task.
+    Returns:
+        Dict of (assignee, status, due month) to number of tasks
+    """
+    expected = {}
+    grouped = select(func.coalesce(Task.assigned_to, 0), func.coalesce(Task.status, ''), Task.due_date,
+                     func.count()).group_by(Task.assigned_to, Task.status, Task.due_date)
+    for assigned_to, status, due_date, tasks in db.session.execute(grouped):
+        key = (assigned_to, status, due_date.replace(day=1))
+        expected[key] = expected.get(key, 0) + tasks
+    return expected
+
+@stats_bp.cli.command('reconcile')
+@click.option('--check', is_flag=True, help='Only report differences, exit with status 1 if any')
+def reconcile(check):
+    """
+    Compare the task_stat summary table with Task and rebuild it if they differ.
+    Meant to run periodically (e.g. from cron); also creates the summary triggers on an
+    existing database.
+    """
+    expected = count_tasks()
+    stored = {(row.assigned_to, row.status, row.due_month): row.tasks
+              for row in db.session.execute(select(TaskStat.__table__))}
+    differences = {key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key)}
+    for key in sorted(differences, key=str)[:20]:
+        click.echo('assigned_to=%s status=%r due_month=%s: stored %s, actual %s' % (
+            key + (stored.get(key, 0), expected.get(key, 0))))
+    click.echo('%d summary rows differ from Task' % len(differences))
+    if check:
+        raise SystemExit(1 if differences else 0)
+
+    # Install the triggers in case the table was created by a migration
+    statements = {'sqlite': TASK_STAT_SQLITE_DDL, 'postgresql': TASK_STAT_POSTGRESQL_DDL}
+    for statement in statements.get(db.engine.dialect.name, ()):
+        db.session.execute(text(statement))
+    if differences:
+        # Rebuild in one transaction; on PostgreSQL lock out writers so no change is lost in between
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('LOCK TABLE task IN SHARE MODE'))
+            expected = count_tasks()
+        db.session.execute(TaskStat.__table__.delete())
+        if expected:
+            db.session.execute(TaskStat.__table__.insert(), [
+                {'assigned_to': assigned_to, 'status': status, 'due_month': due_month, 'tasks': tasks}
+                for (assigned_to, status, due_month), tasks in expected.items()])
+    db.session.commit()
+    click.echo('Summary table rebuilt' if differences else 'Summary table is consistent')
@@ -2,55 +2,71 @@
 # Provides endpoints for viewing assigned tasks and updating task status
 
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from blueprints.database.database import User, Task, db
+from blueprints.database.database import Task, db
+from blueprints.archive.archive import missing_task
+from cache import tasks_changed
+from listing import task_listing
+from roles import role_required, ROLES
+from write_behind import get_queue
 
 # Initialize blueprint for user operations
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/tasks', methods=['GET'])
-@jwt_required()
-def get_tasks():
+@role_required(*ROLES)  # Any authenticated role
+def get_tasks(user):
     """
     Retrieve all tasks assigned to the current user.
+    Args:
+        user: Authenticated user resolved by role_required
     Returns:
         JSON array of tasks and 200 status code on success
         Error message and 500 status code on failure
     """
     try:
-        # Get current user from JWT token
-        user = User.query.filter_by(id=get_jwt_identity()).first()
-        # Query tasks assigned to current user
-        tasks = Task.query.filter_by(assigned_to=user.id).all()
-        # Format tasks for JSON response
-        return jsonify([{
-                'id': task.id,
-                'title': task.title,
-                'description': task.description,
-                'status': task.status,
-                'due_date': task.due_date.strftime('%Y-%m-%d'),
-                'assigned_to': task.assigned_to
-            } for task in tasks]), 200
+        # Query tasks assigned to current user, paginated and projected from the query string
+        return task_listing(Task.query.filter_by(assigned_to=user.id), 'user:%d' % user.id)
     except Exception as e:
         # Log error and return 500 response
         return jsonify({'message': 'Failed to retrieve tasks', 'error': print(e)}), 500
     
 @user_bp.route('/tasks/<int:task_id>', methods=['PUT'])
-@jwt_required()
-def update_task(task_id):
+@role_required(*ROLES)  # Any authenticated role
+def update_task(user, task_id):
     """
     Update status of a specific task assigned to the user.
     Args:
+        user: Authenticated user resolved by role_required
         task_id: Integer ID of the task to update
     """
     try:
-        user = User.query.filter_by(id=get_jwt_identity()).first()
-        task = Task.query.filter_by(id=task_id).first()
         data = request.get_json()
-        
+        queue = get_queue()
+        if queue is not None:
+            # Write-behind mode: check ownership, journal the new status and acknowledge it
+            # before it reaches the database
+            row = db.session.execute(db.select(Task.assigned_to).where(Task.id == task_id)).first()
+            if row is None:
+                return missing_task(task_id, user.id)
+            if row.assigned_to != user.id:
+                return jsonify({'message': 'Unauthorized'}), 401
+            # Rejected now, a value the column cannot hold would fail the whole flushed batch
+            status = data.get('status')
+            if not isinstance(status, str) or len(status) > Task.status.type.length:
+                return jsonify({'message': 'Invalid status'}), 400
+            queue.enqueue(task_id, status, user.id)
+            # Listings overlay queued statuses, so they change now
+            tasks_changed([user.id])
+            return jsonify({'message': 'Task update queued'}), 202
+
+        task = Task.query.filter_by(id=task_id).first()
+        if task is None:
+            return missing_task(task_id, user.id)
+
         if task.assigned_to == user.id:
             task.status = data['status']
             db.session.commit()
+            tasks_changed([task.assigned_to])
             return jsonify({'message': 'Task updated'}), 200
         else:
             return jsonify({'message': 'Unauthorized'}), 401
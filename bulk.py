@@ -0,0 +1,151 @@
+# Bulk task mutations shared by the admin and manager blueprints
+# A batch of creates, partial updates and deletes is validated as a whole, then written
+# with bulk INSERT/UPDATE/DELETE statements in a single transaction
+
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from blueprints.database.database import db, Task
+from cache import tasks_changed
+
+# Fields every created task must provide
+CREATE_FIELDS = ('title', 'description', 'due_date', 'assigned_to')
+
+
+class BulkError(ValueError):
+    """
+    Raised when a batch fails validation; carries the per-item results.
+    """
+
+    def __init__(self, results):
+        super().__init__('Invalid batch')
+        self.results = results
+
+
+def parse_fields(item, fields):
+    """
+    Convert the given fields of a request item to column values.
+    Raises:
+        ValueError: If a value is malformed
+    """
+    values = {}
+    for name in fields:
+        if name not in item:
+            continue
+        value = item[name]
+        if name == 'due_date':
+            value = datetime.strptime(value, '%d-%m-%y')
+        elif name == 'assigned_to':
+            value = int(value)
+        elif not isinstance(value, str):
+            raise ValueError(name + ' must be a string')
+        values[name] = value
+    return values
+
+
+def run_bulk(data, update_fields, assignable=None, owner_id=None):
+    """
+    Validate and apply a batch of task mutations.
+    Args:
+        data: Request body with optional 'create', 'update' (objects with an 'id') and 'delete' (ids) lists
+        update_fields: Fields the caller may change in an update
+        assignable: Callable returning which of a set of user ids the caller may assign to,
+            or None to allow any user
+        owner_id: Only tasks assigned to this user may be updated or deleted, or None for any task
+    Returns:
+        Per-item results for each operation
+    Raises:
+        BulkError: If any item is invalid; nothing is written
+    """
+    creates = data.get('create') or []
+    updates = data.get('update') or []
+    deletes = data.get('delete') or []
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        raise BulkError({'error': 'create, update and delete must be lists'})
+    if len(creates) + len(updates) + len(deletes) > current_app.config['TASK_BULK_MAX_ITEMS']:
+        raise BulkError({'error': 'Batch exceeds TASK_BULK_MAX_ITEMS'})
+
+    results = {'create': [], 'update': [], 'delete': []}
+    failed = False
+    create_rows, update_rows, delete_ids = [], [], []
+
+    # Parse every item before touching the database
+    for index, item in enumerate(creates):
+        try:
+            missing = [name for name in CREATE_FIELDS if name not in item]
+            if missing:
+                raise ValueError('Missing fields: ' + ', '.join(missing))
+            create_rows.append(parse_fields(item, CREATE_FIELDS))
+            results['create'].append({'index': index})
+        except (ValueError, TypeError) as e:
+            results['create'].append({'index': index, 'error': str(e)})
+            failed = True
+    for index, item in enumerate(updates):
+        try:
+            task_id = int(item['id'])
+            unknown = [name for name in item if name != 'id' and name not in update_fields]
+            if unknown:
+                raise ValueError('Cannot update: ' + ', '.join(unknown))
+            update_rows.append(dict(parse_fields(item, update_fields), id=task_id))
+            results['update'].append({'id': task_id})
+        except (KeyError, ValueError, TypeError) as e:
+            results['update'].append({'index': index, 'error': 'Missing id' if isinstance(e, KeyError) else str(e)})
+            failed = True
+    for index, task_id in enumerate(deletes):
+        try:
+            delete_ids.append(int(task_id))
+            results['delete'].append({'id': int(task_id)})
+        except (ValueError, TypeError):
+            results['delete'].append({'index': index, 'error': 'Invalid id'})
+            failed = True
+    if failed:
+        raise BulkError(results)
+
+    # Check every assignee with one query
+    assignees = {row['assigned_to'] for row in create_rows + update_rows if 'assigned_to' in row}
+    allowed = assignees if assignable is None else assignable(assignees)
+    for row, result in zip(create_rows, results['create']):
+        if row['assigned_to'] not in allowed:
+            result['error'] = 'Assignee not found'
+            failed = True
+    for row, result in zip(update_rows, results['update']):
+        if 'assigned_to' in row and row['assigned_to'] not in allowed:
+            result['error'] = 'Assignee not found'
+            failed = True
+
+    # Check every updated or deleted task with one query
+    task_ids = {row['id'] for row in update_rows} | set(delete_ids)
+    owners = {}
+    if task_ids:
+        owners = dict(db.session.execute(select(Task.id, Task.assigned_to).where(Task.id.in_(task_ids))).all())
+    checked = [(row['id'], result) for row, result in zip(update_rows, results['update'])]
+    checked += zip(delete_ids, results['delete'])
+    for task_id, result in checked:
+        if task_id not in owners:
+            result['error'] = 'Task not found'
+            failed = True
+        elif owner_id is not None and owners[task_id] != owner_id:
+            result['error'] = 'Unauthorized'
+            failed = True
+    if failed:
+        raise BulkError(results)
+
+    # Write the whole batch in one transaction
+    try:
+        if create_rows:
+            new_ids = db.session.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), create_rows).all()
+            for result, task_id in zip(results['create'], new_ids):
+                result['id'] = task_id
+        if update_rows:
+            now = datetime.utcnow()
+            db.session.execute(update(Task), [dict(row, updated_at=now) for row in update_rows])
+        if delete_ids:
+            db.session.execute(delete(Task).where(Task.id.in_(delete_ids)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Invalidate cached listings of every assignee touched by the batch
+    tasks_changed([row['assigned_to'] for row in create_rows + update_rows if 'assigned_to' in row] +
+                  [owners[task_id] for task_id in task_ids])
+    return results
@@ -0,0 +1,177 @@
+# Versioned response cache for task listings
+# Every listing scope ('admin', 'manager:<id>', 'user:<id>') has a version counter that the
+# blueprints bump after each task write. Listing ETags are derived from the scope version, so a
+# matching If-None-Match is answered with 304 without querying tasks, and serialized payloads
+# are cached under the ETag until the version moves on.
+
+import hashlib
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import object_session
+from blueprints.database.database import CacheVersion, db, User
+from change_feed import get_notifier
+from team_index import managers_of
+
+
+class MemoryBackend:
+    """
+    In-process backend: scope versions and an LRU of cached payloads.
+    A shared backend (e.g. Redis) for multi-process deployments implements the same methods.
+    Args:
+        maxsize: Maximum number of cached payloads
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        # Random per-backend token so versions restarting at 0 never repeat an old ETag
+        self.epoch = os.urandom(8).hex()
+        self.started = time.time()
+        self._versions = {}
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, scope):
+        """
+        Return the version of a scope and the time it last changed.
+        """
+        with self._lock:
+            return self._versions.get(scope, (0, self.started))
+
+    def bump(self, scopes):
+        """
+        Move each scope to a new version.
+        """
+        now = time.time()
+        with self._lock:
+            for scope in scopes:
+                version, _ = self._versions.get(scope, (0, self.started))
+                self._versions[scope] = (version + 1, now)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._payloads[key] = payload
+            self._payloads.move_to_end(key)
+            # Evict least recently used payloads beyond maxsize
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+
+
+def init_app(app):
+    """
+    Create the app's cache backend configured by TASK_CACHE_BACKEND.
+    The setting is either empty for the in-process backend, or a 'module:factory' path
+    whose factory is called with the app.
+    """
+    path = app.config.get('TASK_CACHE_BACKEND')
+    if path:
+        module, factory = path.split(':')
+        backend = getattr(importlib.import_module(module), factory)(app)
+    else:
+        backend = MemoryBackend(app.config['TASK_CACHE_SIZE'])
+    app.extensions['task_cache'] = backend
+    # Last seen shared tasks version (see shared_version) and when it was seen to change
+    app.extensions['task_cache_version'] = {'version': None, 'changed': 0.0, 'checked': None}
+
+
+def get_backend():
+    """
+    Return the cache backend of the current app.
+    """
+    return current_app.extensions['task_cache']
+
+
+def bump_shared_version():
+    """
+    Bump the shared tasks version in the current transaction.
+    Called by task writers running outside the web workers (the archive job), whose
+    tasks_changed only reaches their own process's cache.
+    """
+    bumped = db.session.execute(update(CacheVersion).where(CacheVersion.name == 'tasks')
+                                .values(version=CacheVersion.version + 1)).rowcount
+    if not bumped:
+        db.session.add(CacheVersion(name='tasks', version=1))
+
+
+def shared_version():
+    """
+    Return the shared tasks version, read from the database at most every
+    TASK_CACHE_VERSION_CHECK seconds, and the time this process saw it change.
+    """
+    state = current_app.extensions['task_cache_version']
+    interval = current_app.config['TASK_CACHE_VERSION_CHECK']
+    if not interval:
+        return 0, 0.0
+    now = time.monotonic()
+    if state['checked'] is None or now - state['checked'] >= interval:
+        version = db.session.execute(select(CacheVersion.version).where(CacheVersion.name == 'tasks')).scalar() or 0
+        # The first read only sets the baseline, this process cached nothing before it
+        if state['version'] is not None and version != state['version']:
+            state['changed'] = time.time()
+        state['version'], state['checked'] = version, now
+    return state['version'], state['changed']
+
+
+def listing_etag(scope, query_string):
+    """
+    Derive the strong ETag of a listing from its scope version, the shared tasks version and
+    the query string.
+    Returns:
+        ETag value (unquoted) and the scope's last modification time
+    """
+    backend = get_backend()
+    version, modified = backend.version(scope)
+    shared, changed = shared_version()
+    raw = '%s|%s|%s|%s|%s' % (getattr(backend, 'epoch', ''), scope, version, shared, query_string)
+    return hashlib.sha1(raw.encode()).hexdigest(), max(modified, changed)
+
+
+def tasks_changed(assignee_ids):
+    """
+    Bump the listing scopes affected by writes to tasks assigned to the given users.
+    Called by the blueprints after committing a task write.
+    Args:
+        assignee_ids: Assignees before and after the write (None entries are ignored)
+    """
+    assignee_ids = {assignee for assignee in assignee_ids if assignee is not None}
+    scopes = {'admin'} | {'user:%d' % assignee for assignee in assignee_ids}
+    # Managers whose teams include the assignees, from the team index
+    scopes |= {'manager:%d' % manager for manager in managers_of(assignee_ids)}
+    get_backend().bump(scopes)
+    # Wake change feed subscribers who can see these tasks
+    get_notifier().notify(assignee_ids)
+
+
+# A user moving between managers changes both managers' listings (and with TEAM_HIERARCHY
+# the listings of the managers above them)
+@event.listens_for(User, 'after_update')
+def _mark_manager_changed(mapper, connection, target):
+    history = inspect(target).attrs.manager_id.history
+    if history.has_changes():
+        managers = object_session(target).info.setdefault('changed_manager_ids', set())
+        managers.update(history.added + history.deleted)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_changed_managers(session):
+    managers = session.info.pop('changed_manager_ids', None)
+    if managers:
+        managers = {int(manager) for manager in managers if manager is not None}
+        managers |= managers_of(managers, build=False) if has_app_context() else set()
+        get_backend().bump({'manager:%d' % manager for manager in managers})
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_managers(session):
+    session.info.pop('changed_manager_ids', None)
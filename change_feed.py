@@ -0,0 +1,122 @@
+# Wake-ups for change feed subscribers (long-poll and Server-Sent Events, see blueprints/changes)
+# A waiting request registers the assignees it can see and sleeps on its own Event, which
+# tasks_changed sets after a commit touching one of them, so idle subscribers cost no queries.
+# Writes committed by other processes are noticed by a check of the newest event sequence,
+# run by at most one waiter per CHANGE_FEED_POLL_INTERVAL for the whole app. Each app has its
+# own notifier (init_app).
+
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+
+
+# WSGI environ key of the flag asgi.py sets when the client of a request disconnects (absent
+# under other servers); waiting subscribers wake on it to free their thread
+DISCONNECT_KEY = 'taskapi.disconnect'
+
+
+class SubscriberLimit(Exception):
+    """
+    Raised when CHANGE_FEED_MAX_SUBSCRIBERS requests are already waiting.
+    """
+
+
+class ChangeNotifier:
+    """
+    Registry of waiting subscribers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (assignee ids, or None for every task; Event set on a relevant change)
+        self._waiters = set()
+        self._latest = None
+        self._checked = 0.0
+
+    def add(self, assignee_ids, limit=0):
+        """
+        Register a waiter for changes to tasks of the given assignees.
+        Args:
+            assignee_ids: Frozenset of assignee ids, or None for every task
+            limit: Largest number of waiters (0 for no limit)
+        Returns:
+            Waiter to pass to remove, whose second item is the Event set on a relevant change
+        Raises:
+            SubscriberLimit: If limit waiters are already registered
+        """
+        waiter = (assignee_ids, threading.Event())
+        with self._lock:
+            if limit and len(self._waiters) >= limit:
+                raise SubscriberLimit()
+            self._waiters.add(waiter)
+        return waiter
+
+    def remove(self, waiter):
+        """
+        Unregister a waiter returned by add.
+        """
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    @contextmanager
+    def subscribe(self, assignee_ids, limit=0):
+        """
+        Register a waiter for the duration of a with block (see add).
+        Yields:
+            Event set when a change may concern the waiter
+        """
+        waiter = self.add(assignee_ids, limit)
+        try:
+            yield waiter[1]
+        finally:
+            self.remove(waiter)
+
+    def waiting(self):
+        """
+        Return the number of registered waiters.
+        """
+        return len(self._waiters)
+
+    def notify(self, assignee_ids=None):
+        """
+        Wake the waiters that can see tasks of the given assignees (None wakes every waiter).
+        """
+        with self._lock:
+            for ids, ready in self._waiters:
+                if assignee_ids is None or ids is None or not ids.isdisjoint(assignee_ids):
+                    ready.set()
+
+    def check(self, latest, interval):
+        """
+        Wake every waiter if the newest event moved since the last check, checking at most once
+        per interval seconds.
+        Args:
+            latest: Callable returning the newest event sequence in the database
+            interval: Seconds between checks
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < interval:
+                return
+            self._checked = now
+        seq = latest()
+        with self._lock:
+            moved = self._latest is not None and seq != self._latest
+            self._latest = seq
+        if moved:
+            self.notify()
+
+
+def init_app(app):
+    """
+    Create the app's notifier.
+    """
+    app.extensions['change_notifier'] = ChangeNotifier()
+
+
+def get_notifier():
+    """
+    Return the notifier of the current app.
+    """
+    return current_app.extensions['change_notifier']
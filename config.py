@@ -1,18 +1,149 @@
-from flask import Flask
+import os
+from datetime import timedelta
 from flask_jwt_extended import JWTManager
 
-# Initialize the Flask application
-app = Flask(__name__)
+def env_flag(name, default=False):
+    """
+    Read a boolean environment variable ('1', 'true' or 'yes' enable it).
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
 
-# Initialize the JWT manager with the Flask app
-jwt = JWTManager(app)
+# JWT manager, bound to the app by create_app
+jwt = JWTManager()
 
-# Configure the SQLAlchemy database URI
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
-# Disable SQLAlchemy event system to save resources
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def configure(app):
+    """
+    Load the configuration from environment variables into app.config.
+    Args:
+        app: Flask app being created by create_app
+    """
+    # Configure the SQLAlchemy database URI (DATABASE_URL overrides the default)
+    database_url = os.environ.get('DATABASE_URL', 'sqlite:///tasks.db')
+    # Accept the postgres:// scheme used by hosting providers
+    if database_url.startswith('postgres://'):
+        database_url = 'postgresql://' + database_url[len('postgres://'):]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    # Disable SQLAlchemy event system to save resources
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Set the secret key for JWT
-app.config['JWT_SECRET_KEY'] = 'your_jwt_secret_key'
-# Disable subject verification for JWT
-app.config['JWT_VERIFY_SUB'] = False
\ No newline at end of file
+    # Connection pool settings, pool sizing only applies to server databases such as PostgreSQL
+    engine_options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True),  # Check connections before use
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Seconds before a connection is replaced
+    }
+    if not database_url.startswith('sqlite'):
+        engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 10))
+        engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+        engine_options['pool_timeout'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    # SQLite connection profile, applied with PRAGMAs on every new connection
+    # WAL lets readers run alongside the writer, NORMAL sync is durable in WAL mode except on power loss
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Milliseconds a connection waits for the write lock before failing with "database is locked"
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    # Bytes of the database file memory-mapped for reads (0 disables it)
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Set the secret key for JWT
+    app.config['JWT_SECRET_KEY'] = 'your_jwt_secret_key'
+    # Disable subject verification for JWT
+    app.config['JWT_VERIFY_SUB'] = False
+
+    # Cross-request cache of authenticated users, keyed by user id (0 disables it)
+    app.config['PRINCIPAL_CACHE_SIZE'] = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 0))
+    # Seconds a cached user stays valid
+    app.config['PRINCIPAL_CACHE_TTL'] = int(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+
+    # Embed role, username and manager_id in access tokens so authorization skips the database
+    app.config['JWT_ROLE_CLAIMS'] = env_flag('JWT_ROLE_CLAIMS')
+    # Lifetime of tokens carrying role claims, bounds how long a role change can go unnoticed
+    # by processes that did not see the change
+    app.config['JWT_ROLE_CLAIMS_EXPIRES'] = timedelta(seconds=int(os.environ.get('JWT_ROLE_CLAIMS_EXPIRES', 900)))
+
+    # Page size of GET /tasks listings when no ?limit= is given (0 returns every task)
+    app.config['TASK_PAGE_DEFAULT_LIMIT'] = int(os.environ.get('TASK_PAGE_DEFAULT_LIMIT', 0))
+    # Largest page a client can request with ?limit=
+    app.config['TASK_PAGE_MAX_LIMIT'] = int(os.environ.get('TASK_PAGE_MAX_LIMIT', 1000))
+    # Rows fetched per batch when streaming task exports (?format=ndjson|stream|csv)
+    app.config['TASK_STREAM_BATCH_SIZE'] = int(os.environ.get('TASK_STREAM_BATCH_SIZE', 1000))
+    # Largest number of items accepted by one bulk task request
+    app.config['TASK_BULK_MAX_ITEMS'] = int(os.environ.get('TASK_BULK_MAX_ITEMS', 10000))
+
+    # Number of serialized task listing pages cached in process
+    app.config['TASK_CACHE_SIZE'] = int(os.environ.get('TASK_CACHE_SIZE', 256))
+    # Optional shared cache backend as 'module:factory', called with the app (default in-process)
+    app.config['TASK_CACHE_BACKEND'] = os.environ.get('TASK_CACHE_BACKEND')
+    # Seconds between checks of the shared tasks version that writers outside the web workers (the
+    # archive job) bump, so cached listings drop their changes within this time (0 never checks)
+    app.config['TASK_CACHE_VERSION_CHECK'] = float(os.environ.get('TASK_CACHE_VERSION_CHECK', 1))
+
+    # Password hashing parameters; stored hashes made with other parameters are upgraded on login
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000000')
+    # Worker processes hashing passwords (0 hashes on the request thread)
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    # Hashing calls allowed in flight; further logins wait PASSWORD_HASH_QUEUE_TIMEOUT seconds, then get a 503
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+    # Start method of the hashing processes; spawn avoids forking a threaded server
+    app.config['PASSWORD_HASH_START_METHOD'] = os.environ.get('PASSWORD_HASH_START_METHOD', 'spawn')
+
+    # JSON encoder for responses: 'default' (stdlib json) or 'orjson' (requires the orjson package)
+    app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'default')
+    # Opt-in request instrumentation: latency histograms, SQL counts and the /metrics endpoint
+    app.config['METRICS_ENABLED'] = env_flag('METRICS_ENABLED', False)
+    # A request running the same SQL statement this many times is logged as a possible N+1
+    app.config['METRICS_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+    # Seconds between stack samples of the on-demand profiler
+    app.config['METRICS_PROFILER_INTERVAL'] = float(os.environ.get('METRICS_PROFILER_INTERVAL', 0.005))
+
+    # ASGI serving (asgi.py): threads running requests at once, keep at most the database pool size
+    app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 16))
+    # Connections the ASGI server accepts before answering 503 (0 for no limit)
+    app.config['ASGI_LIMIT_CONCURRENCY'] = int(os.environ.get('ASGI_LIMIT_CONCURRENCY', 0)) or None
+
+    # Manager teams include the reports of managers below them (manager-of-managers hierarchies)
+    app.config['TEAM_HIERARCHY'] = env_flag('TEAM_HIERARCHY', False)
+    # Seconds before the in-memory team index is rebuilt to pick up other processes' changes (0 never)
+    app.config['TEAM_INDEX_TTL'] = int(os.environ.get('TEAM_INDEX_TTL', 60))
+
+    # Task statuses counted as finished by the stats endpoint (comma separated), others are open
+    app.config['TASK_DONE_STATUSES'] = tuple(
+        status.strip() for status in os.environ.get('TASK_DONE_STATUSES', 'Done').split(',') if status.strip())
+
+    # Write-behind mode for user status updates: acknowledged once journaled, written in batches
+    app.config['STATUS_WRITE_BEHIND'] = env_flag('STATUS_WRITE_BEHIND', False)
+    # Seconds between flushes of queued status updates, sooner when STATUS_FLUSH_BATCH are queued
+    app.config['STATUS_FLUSH_INTERVAL'] = float(os.environ.get('STATUS_FLUSH_INTERVAL', 0.5))
+    app.config['STATUS_FLUSH_BATCH'] = int(os.environ.get('STATUS_FLUSH_BATCH', 500))
+    # Journal of queued updates replayed on startup; each process locks its own slot of it
+    # (status-journal.log, status-journal.1.log, ...)
+    app.config['STATUS_JOURNAL_PATH'] = os.environ.get(
+        'STATUS_JOURNAL_PATH', os.path.join(app.instance_path, 'status-journal.log'))
+    # Sync the journal to disk before acknowledging, otherwise an OS crash can lose acknowledged updates
+    app.config['STATUS_JOURNAL_FSYNC'] = env_flag('STATUS_JOURNAL_FSYNC', True)
+
+    # Change feed (/api/changes): events per response, and the longest ?wait= a long-poll may ask for
+    app.config['CHANGE_FEED_PAGE_LIMIT'] = int(os.environ.get('CHANGE_FEED_PAGE_LIMIT', 100))
+    app.config['CHANGE_FEED_MAX_WAIT'] = float(os.environ.get('CHANGE_FEED_MAX_WAIT', 30))
+    # Seconds between checks for events written by other processes (0 when a single process writes)
+    app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1))
+    # Seconds between keepalive comments on idle event streams, and before a stream ends for the client to reconnect
+    app.config['CHANGE_FEED_KEEPALIVE'] = float(os.environ.get('CHANGE_FEED_KEEPALIVE', 15))
+    app.config['CHANGE_FEED_STREAM_SECONDS'] = float(os.environ.get('CHANGE_FEED_STREAM_SECONDS', 300))
+    # Long-polls and streams allowed at once per process, further ones get a 503 (0 for no limit).
+    # Each one holds a server thread while it waits, so the limit must stay well below the threads
+    # serving requests or idle subscribers starve every other endpoint: by default a quarter of
+    # ASGI_THREADS; under gunicorn set it below --threads (sync workers have a single thread)
+    app.config['CHANGE_FEED_MAX_SUBSCRIBERS'] = int(os.environ.get(
+        'CHANGE_FEED_MAX_SUBSCRIBERS', max(1, app.config['ASGI_THREADS'] // 4)))
+
+    # Finished tasks (TASK_DONE_STATUSES) unchanged for this many days are moved to the archive by `flask archive run`
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    # Tasks moved per archive transaction, and seconds the job pauses between them for other writers
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    app.config['ARCHIVE_BATCH_PAUSE'] = float(os.environ.get('ARCHIVE_BATCH_PAUSE', 0.05))
@@ -0,0 +1,2 @@
+# pytest configuration: its presence at the repository root puts the root on sys.path, so the
+# tests import the application modules (app, listing, ...) as the app itself does
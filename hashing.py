@@ -0,0 +1,102 @@
+# Password hashing offloaded to a bounded process pool
+# pbkdf2 is CPU bound; running it in worker processes keeps a burst of logins from
+# starving the request threads that serve the rest of the API
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """
+    Raised when no hashing slot frees up within PASSWORD_HASH_QUEUE_TIMEOUT.
+    """
+
+
+class HashingPool:
+    """
+    Worker processes and in-flight limit of an app; the processes start on first use.
+    Args:
+        config: App config with the PASSWORD_HASH_* settings
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.slots = threading.BoundedSemaphore(config['PASSWORD_HASH_MAX_PENDING'])
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.config['PASSWORD_HASH_WORKERS'],
+                        mp_context=multiprocessing.get_context(self.config['PASSWORD_HASH_START_METHOD']))
+        return self._executor
+
+
+def init_app(app):
+    """
+    Create the app's hashing pool.
+    """
+    app.extensions['password_hashing'] = HashingPool(app.config)
+
+
+def _run(func, *args):
+    """
+    Run a hashing function in the pool, or inline when PASSWORD_HASH_WORKERS is 0.
+    Raises:
+        HashingBusy: If PASSWORD_HASH_MAX_PENDING calls are already in flight for too long
+    """
+    if not current_app.config['PASSWORD_HASH_WORKERS']:
+        return func(*args)
+    pool = current_app.extensions['password_hashing']
+    executor = pool.executor()
+    if not pool.slots.acquire(timeout=current_app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+        raise HashingBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        pool.slots.release()
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured PASSWORD_HASH_METHOD.
+    """
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'], 16)
+
+
+def verify_password(stored_hash, password):
+    """
+    Check a password against a stored hash.
+    """
+    return _run(check_password_hash, stored_hash, password)
+
+
+# Prefix Werkzeug stores for each configured PASSWORD_HASH_METHOD; depends only on the method
+_method_prefixes = {}
+
+
+def method_prefix():
+    """
+    Return the method prefix of hashes made with PASSWORD_HASH_METHOD.
+    Werkzeug stores the method with its defaults filled in ('pbkdf2' becomes
+    'pbkdf2:sha256:1000000', 'scrypt' becomes 'scrypt:32768:8:1'), so a dummy password is
+    hashed once per process to learn it.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = _method_prefixes[method] = _run(generate_password_hash, '', method, 1).split('$', 1)[0]
+    return prefix
+
+
+def needs_rehash(stored_hash):
+    """
+    Whether a stored hash was made with different parameters than PASSWORD_HASH_METHOD.
+    """
+    return stored_hash.split('$', 1)[0] != method_prefix()
@@ -0,0 +1,218 @@
+# Request instrumentation: per-endpoint latency histograms, SQL statement counts and time,
+# named spans for the hot path and N+1 query detection, plus an on-demand sampling profiler
+# Everything is a no-op until the metrics blueprint is registered (METRICS_ENABLED)
+
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogram bucket upper bounds for statements per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Set when the metrics blueprint is registered
+enabled = False
+
+
+class Registry:
+    """
+    Thread-safe store of counters and histograms, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels, amount=1):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            histogram = series[key]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for key, value in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, text = self._help.get(name, ('counter', name))
+                lines += ['# HELP %s %s' % (name, text), '# TYPE %s counter' % name]
+                lines += ['%s%s %s' % (name, format_labels(labels), value) for labels, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                kind, text = self._help.get(name, ('histogram', name))
+                lines += ['# HELP %s %s' % (name, text), '# TYPE %s histogram' % name]
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram['buckets'], histogram['counts']):
+                        lines.append('%s_bucket%s %d' % (name, format_labels(labels, [('le', bound)]), count))
+                    lines.append('%s_bucket%s %d' % (name, format_labels(labels, [('le', '+Inf')]), histogram['count']))
+                    lines.append('%s_sum%s %f' % (name, format_labels(labels), histogram['sum']))
+                    lines.append('%s_count%s %d' % (name, format_labels(labels), histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+registry.describe('taskapi_request_duration_seconds', 'histogram', 'Request latency by endpoint')
+registry.describe('taskapi_request_sql_statements', 'histogram', 'SQL statements executed per request')
+registry.describe('taskapi_request_sql_seconds', 'histogram', 'Time spent in SQL per request')
+registry.describe('taskapi_span_duration_seconds', 'histogram', 'Time spent in instrumented spans per request')
+registry.describe('taskapi_n_plus_one_total', 'counter', 'Requests repeating one SQL statement N_PLUS_ONE_THRESHOLD times or more')
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block as a named span of the current request.
+    """
+    if not enabled or not has_request_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = g.setdefault('metrics_spans', {})
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - started
+
+
+def label_endpoint(name):
+    """
+    Report the current request under another endpoint name, e.g. the handler an /api call dispatched to.
+    """
+    if enabled and has_request_context():
+        g.metrics_endpoint = name
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_statements = Counter()
+    g.metrics_sql_seconds = 0.0
+
+
+def finish_request(response):
+    if 'metrics_started' not in g:
+        return response
+    endpoint = g.get('metrics_endpoint') or request.endpoint or 'unknown'
+    labels = {'endpoint': endpoint, 'method': request.method, 'status': response.status_code}
+    registry.observe('taskapi_request_duration_seconds', labels, time.perf_counter() - g.metrics_started)
+    registry.observe('taskapi_request_sql_statements', {'endpoint': endpoint},
+                     sum(g.metrics_statements.values()), COUNT_BUCKETS)
+    registry.observe('taskapi_request_sql_seconds', {'endpoint': endpoint}, g.metrics_sql_seconds)
+    for name, seconds in g.get('metrics_spans', {}).items():
+        registry.observe('taskapi_span_duration_seconds', {'endpoint': endpoint, 'span': name}, seconds)
+
+    # Flag the same statement executed over and over within one request
+    threshold = current_app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+    if g.metrics_statements:
+        statement, count = g.metrics_statements.most_common(1)[0]
+        if count >= threshold:
+            registry.inc('taskapi_n_plus_one_total', {'endpoint': endpoint})
+            current_app.logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+                                       endpoint, count, ' '.join(statement.split())[:200])
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_statements' in g:
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_statements' in g and conn.info.get('metrics_query_started'):
+        g.metrics_sql_seconds += time.perf_counter() - conn.info['metrics_query_started'].pop()
+        g.metrics_statements[statement] += 1
+
+
+def install_sql_hooks():
+    """
+    Count and time statements on every engine.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread at a fixed interval while running.
+    Results are collapsed stacks ('outer;inner count'), as consumed by flamegraph tools.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = Counter()
+        self.interval = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval):
+        with self._lock:
+            if self.running:
+                return
+            self.samples = Counter()
+            self.interval = interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = ';'.join('%s:%s' % (entry.filename.rsplit('/', 1)[-1], entry.name)
+                                 for entry in traceback.extract_stack(frame))
+                self.samples[stack] += 1
+
+    def collapsed(self, top):
+        """
+        Return the most frequent stacks in collapsed format.
+        """
+        return ''.join('%s %d\n' % (stack, count) for stack, count in self.samples.most_common(top))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,404 @@
+# Task listing helpers shared by the GET /tasks endpoints
+# Supports filtering and search (see FILTERS and ?q=), keyset pagination (?limit=&cursor=),
+# stable ordering (?sort=), field projection (?fields=), streamed exports (?format=ndjson|stream|csv)
+# and archived tasks (?include_archived=1)
+
+import base64
+import csv
+import io
+import json
+from datetime import date, datetime, timezone
+from itertools import islice
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import Integer, and_, or_, select, text, tuple_, union_all
+from sqlalchemy.sql.util import ClauseAdapter
+from sqlalchemy.sql.visitors import replacement_traverse
+from blueprints.database.database import db, Task, TaskArchive
+from cache import get_backend, listing_etag
+from serializers import TASK_FIELDS, row_serializer, task_columns
+from instrumentation import span
+from write_behind import pending_statuses
+
+# Columns that can be used as the sort key; ties are always broken by id
+SORT_KEYS = {
+    'id': Task.id,
+    'due_date': Task.due_date,
+    'created_at': Task.created_at,
+    'updated_at': Task.updated_at,
+}
+
+# Backends sorting NULLs after every value in ascending order (SQLite and MySQL sort them first)
+NULLS_SORT_HIGH = ('postgresql', 'oracle')
+
+# Query string filters: parameter -> (column, comparison, value parser)
+FILTERS = {
+    'status': (Task.status, 'in', str),
+    'assigned_to': (Task.assigned_to, 'in', int),
+    'due_from': (Task.due_date, '>=', date.fromisoformat),
+    'due_to': (Task.due_date, '<=', date.fromisoformat),
+    'created_from': (Task.created_at, '>=', datetime.fromisoformat),
+    'created_to': (Task.created_at, '<=', datetime.fromisoformat),
+    'updated_from': (Task.updated_at, '>=', datetime.fromisoformat),
+    'updated_to': (Task.updated_at, '<=', datetime.fromisoformat),
+}
+
+
+# Streamed output formats and their content types
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'stream': 'application/json',
+    'csv': 'text/csv',
+}
+
+
+class ListingError(ValueError):
+    """
+    Raised for invalid listing query parameters.
+    """
+
+
+def parse_listing_args(args):
+    """
+    Validate the listing query parameters.
+    Args:
+        args: Request query string arguments
+    Returns:
+        Dict with filter clauses, search terms, fields, sort key, descending flag, limit, decoded cursor,
+        output format and whether to include archived tasks
+    Raises:
+        ListingError: If a parameter is invalid
+    """
+    # Column filters; 'in' filters take comma separated values
+    filters = []
+    for name, (column, comparison, parse) in FILTERS.items():
+        if not args.get(name):
+            continue
+        try:
+            if comparison == 'in':
+                filters.append(column.in_([parse(value) for value in args[name].split(',')]))
+            elif comparison == '>=':
+                filters.append(column >= parse(args[name]))
+            else:
+                filters.append(column <= parse(args[name]))
+        except ValueError:
+            raise ListingError('Invalid value for ' + name)
+    # Full-text search over title and description, applied by build_query
+    search = args.get('q', '').strip()
+
+    # Requested fields, in the order given
+    fields = TASK_FIELDS
+    if args.get('fields'):
+        fields = tuple(name.strip() for name in args['fields'].split(',') if name.strip())
+        unknown = [name for name in fields if name not in TASK_FIELDS]
+        if unknown or not fields:
+            raise ListingError('Unknown fields: ' + ', '.join(unknown))
+
+    # Sort key, prefixed with '-' for descending order
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in SORT_KEYS:
+        raise ListingError('Cannot sort by ' + sort)
+
+    # Output format, 'json' for a single document or one of the streamed formats
+    output = args.get('format', 'json')
+    if output != 'json' and output not in STREAM_FORMATS:
+        raise ListingError('Unknown format ' + output)
+
+    # Page size, capped by TASK_PAGE_MAX_LIMIT; 0 means unpaginated unless a default page size is set
+    # Streamed exports are only limited when the client asks for it
+    default_limit = current_app.config['TASK_PAGE_DEFAULT_LIMIT'] if output == 'json' else 0
+    try:
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        raise ListingError('limit must be an integer')
+    if limit < 0 or (limit == 0 and default_limit):
+        raise ListingError('limit must be a positive integer')
+    if output == 'json':
+        limit = min(limit, current_app.config['TASK_PAGE_MAX_LIMIT'])
+
+    # Archived tasks are only read on request
+    archived = args.get('include_archived', '0').lower()
+    if archived not in ('0', '1', 'true', 'false'):
+        raise ListingError('include_archived must be 1 or 0')
+
+    cursor = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+    return {'filters': filters, 'search': search, 'fields': fields, 'sort': sort, 'descending': descending,
+            'limit': limit, 'cursor': cursor, 'format': output, 'archived': archived in ('1', 'true')}
+
+
+def encode_cursor(sort, row):
+    """
+    Encode the keyset position after a row as an opaque cursor string.
+    """
+    value = getattr(row, sort)
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([value, row.id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Decode a cursor produced by encode_cursor for the given sort key.
+    Raises:
+        ListingError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, task_id = json.loads(raw)
+        # Rows inserted without timestamps have NULL created_at and updated_at
+        if value is None and sort in ('created_at', 'updated_at'):
+            return None, int(task_id)
+        if sort == 'due_date':
+            value = date.fromisoformat(value)
+        elif sort in ('created_at', 'updated_at'):
+            value = datetime.fromisoformat(value)
+        return int(value) if sort == 'id' else value, int(task_id)
+    except (ValueError, TypeError):
+        raise ListingError('Invalid cursor')
+
+
+def search_clause(search, indexed=True):
+    """
+    Build the filter clause for a ?q= search over task titles and descriptions.
+    Every term must match, as a prefix. SQLite uses the task_fts FTS5 index, other
+    backends (and searches including archived tasks, which are not indexed) fall back
+    to case-insensitive LIKE.
+    """
+    terms = search.split()
+    if indexed and db.engine.dialect.name == 'sqlite':
+        # Quote each term so user input cannot inject FTS5 query syntax
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        matches = text('SELECT rowid FROM task_fts WHERE task_fts MATCH :match').bindparams(match=match)
+        return Task.id.in_(matches.columns(rowid=Integer))
+    return and_(*(or_(Task.title.ilike('%' + term + '%'), Task.description.ilike('%' + term + '%'))
+                  for term in terms))
+
+
+def archive_column(element):
+    # Replace a Task column with the TaskArchive column of the same name
+    if getattr(element, 'table', None) is Task.__table__:
+        return TaskArchive.__table__.c[element.name]
+    return None
+
+
+def with_archive(query):
+    """
+    Select from current and archived tasks alike, within the scope of a task query.
+    Returns:
+        Subquery of every task column over both tables
+    """
+    scope = query.whereclause
+    current = select(*Task.__table__.c)
+    archived = select(*(TaskArchive.__table__.c[column.name] for column in Task.__table__.c))
+    if scope is not None:
+        current = current.where(scope)
+        archived = archived.where(replacement_traverse(scope, {}, archive_column))
+    return union_all(current, archived).subquery('tasks')
+
+
+def build_query(query, options):
+    """
+    Apply filters, projection and keyset ordering to a scoped task query.
+    Args:
+        query: Task query already restricted to the caller's scope
+        options: Parsed listing arguments from parse_listing_args
+    Returns:
+        Ordered query selecting the requested columns, positioned after the cursor
+    """
+    sort = options['sort']
+    # Select plain columns, the requested fields first, then any the keyset needs
+    names = list(dict.fromkeys(options['fields'] + ('id', sort)))
+    filters = list(options['filters'])
+    if options['search']:
+        filters.append(search_clause(options['search'], indexed=not options['archived']))
+    order = (Task.id,) if sort == 'id' else (SORT_KEYS[sort], Task.id)
+    if options['archived']:
+        # The same columns and clauses, taken from the union of both tables
+        source = with_archive(query)
+        query = db.session.query(*(source.c[name] for name in names))
+        filters = [ClauseAdapter(source).traverse(clause) for clause in filters]
+        order = tuple(source.c[column.key] for column in order)
+    else:
+        query = query.with_entities(*task_columns(names))
+    query = query.filter(*filters)
+
+    # Keyset on (sort column, id), or on id alone
+    if options['cursor']:
+        query = query.filter(keyset_clause(order, options['cursor'], options['descending']))
+    return query.order_by(*(column.desc() for column in order) if options['descending'] else order)
+
+
+def keyset_clause(order, cursor, descending):
+    """
+    Build the clause selecting the rows after a cursor position.
+    NULL sort values (timestamps of rows inserted without them) are placed where the backend
+    sorts them, so the ordering keeps using the column's index.
+    Args:
+        order: Order columns, (id,) or (sort column, id)
+        cursor: Decoded cursor, (sort value, id)
+        descending: Whether the listing is in descending order
+    Returns:
+        Filter clause
+    """
+    value, task_id = cursor
+    column, id_column = order if len(order) == 2 else (None, order[0])
+    after_id = id_column < task_id if descending else id_column > task_id
+    if column is None:
+        return after_id
+    # NULLs come after every value when the backend sorts them high in ascending order,
+    # or low in descending order
+    nulls_last = (db.engine.dialect.name in NULLS_SORT_HIGH) != descending
+    if value is None:
+        # Among the NULLs, then every value if NULLs come first
+        after = and_(column.is_(None), after_id)
+        return after if nulls_last else or_(after, column.isnot(None))
+    key, position = tuple_(column, id_column), tuple_(value, task_id)
+    after = key < position if descending else key > position
+    return or_(after, column.is_(None)) if nulls_last else after
+
+
+def query_tasks(query, options):
+    """
+    Run a scoped task query for one page.
+    Args:
+        query: Task query already restricted to the caller's scope
+        options: Parsed listing arguments from parse_listing_args
+    Returns:
+        List of rows and the cursor of the next page, or None on the last page
+    """
+    query = build_query(query, options)
+    if not options['limit']:
+        return query.all(), None
+    # Fetch one extra row to know whether another page follows
+    rows = query.limit(options['limit'] + 1).all()
+    if len(rows) <= options['limit']:
+        return rows, None
+    rows = rows[:options['limit']]
+    return rows, encode_cursor(options['sort'], rows[-1])
+
+
+def batches(rows, size):
+    """
+    Group an iterator of rows into lists of at most size rows.
+    """
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def overlay_serializer(options):
+    """
+    Return the row serializer of a listing, showing queued status updates in place of the
+    stored status (read-your-writes with STATUS_WRITE_BEHIND). Filters and sorting still see
+    the stored status until the update is flushed.
+    """
+    serialize = row_serializer(options['fields'])
+    pending = pending_statuses() if 'status' in options['fields'] else None
+    if not pending:
+        return serialize
+
+    def overlay(row):
+        data = serialize(row)
+        # build_query always selects id
+        status = pending.get(row.id)
+        if status is not None:
+            data['status'] = status
+        return data
+    return overlay
+
+
+def stream_tasks(query, options):
+    """
+    Generate the streamed export of a scoped task query.
+    Rows are fetched in batches of TASK_STREAM_BATCH_SIZE and written out batch by batch,
+    so memory stays flat whatever the number of rows.
+    Args:
+        query: Task query already restricted to the caller's scope
+        options: Parsed listing arguments from parse_listing_args
+    Yields:
+        Chunks of NDJSON lines, a JSON array or CSV text
+    """
+    batch_size = current_app.config['TASK_STREAM_BATCH_SIZE']
+    query = build_query(query, options)
+    if options['limit']:
+        query = query.limit(options['limit'])
+    rows = iter(query.yield_per(batch_size))
+    serialize = overlay_serializer(options)
+    dumps = current_app.json.dumps
+
+    if options['format'] == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(options['fields'])
+        for batch in batches(rows, batch_size):
+            writer.writerows(serialize(row).values() for row in batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif options['format'] == 'ndjson':
+        for batch in batches(rows, batch_size):
+            yield ''.join(dumps(serialize(row)) + '\n' for row in batch)
+    else:
+        # Chunked JSON array, the separator goes before every row but the first
+        yield '['
+        separator = ''
+        for batch in batches(rows, batch_size):
+            yield separator + ','.join(dumps(serialize(row)) for row in batch)
+            separator = ','
+        yield ']'
+
+
+def task_listing(query, scope):
+    """
+    Build the JSON response for a scoped task query from the request's listing parameters.
+    Conditional requests matching the scope's current ETag (or not modified since its last
+    change) get a 304 without running the query, and serialized pages are cached per ETag.
+    Args:
+        query: Task query already restricted to the caller's scope
+        scope: Cache scope of the query, e.g. 'admin', 'manager:<id>' or 'user:<id>'
+    Returns:
+        JSON array of tasks and 200 status code, with the next page cursor in X-Next-Cursor
+        Streamed response and 200 status code when a streamed format is requested
+        Empty response and 304 status code if the client's copy is current
+        Error message and 400 status code for invalid parameters
+    """
+    try:
+        options = parse_listing_args(request.args)
+    except ListingError as e:
+        return jsonify({'message': 'Invalid query parameters', 'error': str(e)}), 400
+
+    etag, modified = listing_etag(scope, request.query_string.decode())
+    # HTTP dates have one second resolution
+    last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+    if etag in request.if_none_match or (
+            not request.if_none_match and request.if_modified_since and last_modified <= request.if_modified_since):
+        response = Response(status=304)
+    elif options['format'] in STREAM_FORMATS:
+        # Stream the export, keeping the request context (and DB session) open while it runs
+        response = Response(stream_with_context(stream_tasks(query, options)),
+                            mimetype=STREAM_FORMATS[options['format']])
+    else:
+        backend = get_backend()
+        cached = backend.get(etag)
+        if cached is None:
+            with span('query'):
+                rows, next_cursor = query_tasks(query, options)
+            with span('serialize'):
+                serialize = overlay_serializer(options)
+                cached = (jsonify([serialize(row) for row in rows]).get_data(), next_cursor)
+            backend.set(etag, cached)
+        body, next_cursor = cached
+        response = Response(body, mimetype='application/json')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Clients may store listings but must revalidate them
+    response.cache_control.no_cache = True
+    return response, response.status_code
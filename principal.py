@@ -0,0 +1,216 @@
+# Principal resolution: loads the authenticated user once per request
+# Optionally keeps a cross-request LRU/TTL cache keyed by user id, invalidated whenever
+# a User row is updated or deleted
+# With JWT_ROLE_CLAIMS enabled the principal is read from the token claims instead, and
+# tokens issued before a change to their user are rejected
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, g, has_app_context
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from blueprints.database.database import db, User
+from config import jwt
+from instrumentation import span
+
+# Immutable snapshot of the columns authorization and handlers need
+Principal = namedtuple('Principal', ['id', 'username', 'role', 'manager_id'])
+
+
+class PrincipalCache:
+    """
+    Thread-safe LRU cache of principals with a per-entry time to live.
+    Args:
+        maxsize: Maximum number of cached principals
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires = entry
+            # Drop expired entries on read
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, user_id, principal):
+        with self._lock:
+            self._entries[user_id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            # Evict least recently used entries beyond maxsize
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Claims embedded in access tokens when JWT_ROLE_CLAIMS is enabled
+ROLE_CLAIMS = ('username', 'role', 'manager_id')
+# Claim with the exact issue time of a claim token, as iat only has one second resolution
+ISSUED_CLAIM = 'issued_at'
+
+class PrincipalState:
+    """
+    Per-app principal state: the cross-request cache and the time of the last committed change
+    per user id (oldest first), before which claim tokens are revoked.
+    Args:
+        cache: PrincipalCache, or None when PRINCIPAL_CACHE_SIZE is 0
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.changed_at = OrderedDict()
+        self.lock = threading.Lock()
+
+
+def init_app(app):
+    """
+    Create the app's principal state from PRINCIPAL_CACHE_SIZE/PRINCIPAL_CACHE_TTL.
+    """
+    maxsize = app.config.get('PRINCIPAL_CACHE_SIZE', 0)
+    cache = PrincipalCache(maxsize, app.config.get('PRINCIPAL_CACHE_TTL', 60)) if maxsize else None
+    app.extensions['principal'] = PrincipalState(cache)
+
+
+def get_cache():
+    """
+    Return the cross-request principal cache, or None when it is disabled.
+    """
+    return current_app.extensions['principal'].cache
+
+
+def invalidate(user_id):
+    """
+    Drop a user from the cross-request cache and revoke claim tokens issued before now.
+    """
+    state = current_app.extensions['principal']
+    now = time.time()
+    lifetime = current_app.config['JWT_ROLE_CLAIMS_EXPIRES'].total_seconds()
+    with state.lock:
+        state.changed_at.pop(user_id, None)
+        state.changed_at[user_id] = now
+        # Tokens issued before older changes have expired, so the entries can go
+        while next(iter(state.changed_at.values())) < now - lifetime:
+            state.changed_at.popitem(last=False)
+    if state.cache is not None:
+        state.cache.invalidate(user_id)
+
+
+def role_claims(user):
+    """
+    Build the additional token claims for a user.
+    Args:
+        user: User row or Principal
+    Returns:
+        Dict of claims, empty unless JWT_ROLE_CLAIMS is enabled
+    """
+    if not current_app.config.get('JWT_ROLE_CLAIMS'):
+        return {}
+    claims = {name: getattr(user, name) for name in ROLE_CLAIMS}
+    claims[ISSUED_CLAIM] = time.time()
+    return claims
+
+
+@jwt.token_in_blocklist_loader
+def _claims_revoked(jwt_header, jwt_payload):
+    # Only claim tokens carry state that can go stale, plain tokens are checked against the DB
+    if 'role' not in jwt_payload:
+        return False
+    state = current_app.extensions['principal']
+    with state.lock:
+        changed_at = state.changed_at.get(int(jwt_payload['sub']))
+    if changed_at is None:
+        return False
+    if ISSUED_CLAIM in jwt_payload:
+        return jwt_payload[ISSUED_CLAIM] <= changed_at
+    # Tokens without the exact issue time: revoke the whole second of the change
+    return jwt_payload['iat'] <= int(changed_at)
+
+
+def load_principal(user_id):
+    """
+    Load a principal by user id, going through the cross-request cache when enabled.
+    Args:
+        user_id: Primary key of the user
+    Returns:
+        Principal, or None if the user does not exist
+    """
+    # Identities may arrive as strings from the token, cache keys are integer ids
+    user_id = int(user_id)
+    cache = get_cache()
+    if cache is not None:
+        principal = cache.get(user_id)
+        if principal is not None:
+            return principal
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    principal = Principal(user.id, user.username, user.role, user.manager_id)
+    if cache is not None:
+        cache.set(user_id, principal)
+    return principal
+
+
+def current_principal():
+    """
+    Return the principal for the JWT of the current request.
+    The result is stored on the request context so each request loads the user at most once.
+    """
+    if 'principal' not in g:
+        claims = get_jwt()
+        if 'role' in claims:
+            # Authorize from the token alone
+            g.principal = Principal(int(get_jwt_identity()), *(claims[name] for name in ROLE_CLAIMS))
+        else:
+            with span('principal'):
+                g.principal = load_principal(get_jwt_identity())
+    return g.principal
+
+
+# Collect ids of users changed or deleted in a flush, and invalidate them once the transaction
+# commits so a concurrent request cannot re-cache the old row in between. New users are not
+# marked: nothing about them is cached and they hold no tokens yet.
+@event.listens_for(User, 'after_delete')
+def _mark_user_changed(mapper, connection, target):
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+# Updates only matter when a principal column changed (not e.g. a password rehash)
+@event.listens_for(User, 'after_update')
+def _mark_user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('id',) + ROLE_CLAIMS):
+        _mark_user_changed(mapper, connection, target)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate(user_id)
+        # Also drop a principal cached earlier in this request
+        if has_app_context() and g.get('principal') is not None and g.principal.id == user_id:
+            g.pop('principal')
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
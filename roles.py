@@ -1,19 +1,47 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from blueprints.database.database import User  # Adjust the import based on your project structure
+from flask_jwt_extended import verify_jwt_in_request
+from instrumentation import span
+from principal import current_principal
+from team_index import team_of
+
+# Every role known to the API
+ROLES = ('Admin', 'Manager', 'User')
 
 # Decorator to restrict access to users with specific roles
+# The decorated handler receives the resolved user as its first argument, and the
+# undecorated handler is exposed as `.handler` so the /api router can call it in-process
 def role_required(*roles):
     def wrapper(func):
-        @jwt_required()
         def wrapped(*args, **kwargs):
-            # Get the current user based on the JWT identity
-            current_user = User.query.get(get_jwt_identity())
+            # Requires a valid JWT token, verified inside its own span
+            with span('jwt'):
+                verify_jwt_in_request()
+            # Get the current user based on the JWT identity, loaded once per request
+            current_user = current_principal()
+            if current_user is None:
+                return jsonify({'error': 'Unauthorized'}), 401
             # Check if the user's role is in the allowed roles
             if current_user.role not in roles:
                 return jsonify({'error': 'Unauthorized'}), 403
-            return func(*args, **kwargs)
+            return func(current_user, *args, **kwargs)
         wrapped.__name__ = func.__name__
+        wrapped.handler = func
         return wrapped
     return wrapper
+
+
+def scope_filter(user, column):
+    """
+    Restrict rows to the tasks a user may see.
+    Args:
+        user: Authenticated user resolved by role_required
+        column: Assignee column to filter on
+    Returns:
+        Where clause, or None for every task
+    """
+    if user.role == 'Admin':
+        return None
+    if user.role == 'Manager':
+        return column.in_(team_of(user.id))
+    return column == user.id
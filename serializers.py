@@ -0,0 +1,81 @@
+# Serialization of Task rows shared by every blueprint
+# Listings select plain column tuples (no ORM entity hydration) and turn them into dicts
+# with a serializer built once per field list. An optional orjson JSON provider can replace
+# Flask's stdlib json one.
+
+from flask.json.provider import DefaultJSONProvider
+from blueprints.database.database import Task
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+# Fields returned when no projection is requested
+TASK_FIELDS = ('id', 'title', 'description', 'status', 'due_date', 'assigned_to')
+
+# Fields holding dates, sent as YYYY-MM-DD
+DATE_FIELDS = ('due_date',)
+
+
+def task_columns(fields):
+    """
+    Task columns to select for the given field names, in the same order.
+    """
+    return [getattr(Task, name) for name in fields]
+
+
+def row_serializer(fields):
+    """
+    Build a function turning a row whose first columns are the given fields into a dict.
+    Args:
+        fields: Field names, in the order they were selected
+    Returns:
+        Callable taking a row tuple and returning a JSON-ready dict
+    """
+    dates = [name for name in fields if name in DATE_FIELDS]
+
+    def serialize(row):
+        task = dict(zip(fields, row))
+        for name in dates:
+            # date.isoformat gives YYYY-MM-DD and is much cheaper than strftime
+            task[name] = task[name].isoformat()
+        return task
+    return serialize
+
+
+def serialize_task(task, fields=TASK_FIELDS):
+    """
+    Format a single Task entity or row for JSON output.
+    """
+    return row_serializer(fields)(tuple(getattr(task, name) for name in fields))
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider using orjson, enabled with JSON_PROVIDER = 'orjson'.
+    Keys are sorted like the default provider, and dates plus types orjson does not know
+    go through the default provider's conversions so output matches it.
+    """
+
+    options = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def init_json_provider(app):
+    """
+    Install the JSON provider selected by JSON_PROVIDER on the app.
+    Falls back to the default provider when orjson is not installed.
+    """
+    if app.config['JSON_PROVIDER'] == 'orjson':
+        if orjson is None:
+            app.logger.warning('JSON_PROVIDER is orjson but orjson is not installed, using the default provider')
+            return
+        app.json = OrjsonProvider(app)
+
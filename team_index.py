@@ -0,0 +1,191 @@
+# In-memory index of reporting lines: manager id -> ids of the users reporting to them
+# Built from one query on first use, kept current from User insert/update/delete events once
+# their transaction commits, and rebuilt every TEAM_INDEX_TTL seconds so changes committed by
+# other processes are picked up. Manager listings become `assigned_to IN (team)` and assignee
+# checks are set lookups. With TEAM_HIERARCHY enabled a manager's team also includes the
+# reports of the managers below them, computed once per manager and index version.
+
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+from blueprints.database.database import db, User
+
+# Marks a deleted user in the pending changes of a session
+DELETED = object()
+
+
+class TeamIndex:
+    """
+    Reporting lines of every user.
+    Args:
+        rows: (user id, manager id) pairs, manager id None for users without a manager
+    """
+
+    def __init__(self, rows):
+        self.built = time.monotonic()
+        self._manager_of = {}
+        self._reports = {}
+        self._closure = {}
+        self._lock = threading.Lock()
+        for user_id, manager_id in rows:
+            self._set(user_id, manager_id)
+
+    def _set(self, user_id, manager_id):
+        # Reports are frozensets replaced on change, so readers never see one being modified
+        previous = self._manager_of.pop(user_id, None)
+        if previous is not None:
+            self._reports[previous] = self._reports[previous] - {user_id}
+        if manager_id is not None:
+            # Registration may have passed the id as a string
+            manager_id = int(manager_id)
+            self._manager_of[user_id] = manager_id
+            self._reports[manager_id] = self._reports.get(manager_id, frozenset()) | {user_id}
+
+    def update(self, changes):
+        """
+        Apply committed changes.
+        Args:
+            changes: Dict of user id to new manager id (None for no manager), or DELETED
+        """
+        with self._lock:
+            for user_id, manager_id in changes.items():
+                self._set(user_id, None if manager_id is DELETED else manager_id)
+            # Any change can move a whole subtree, recompute hierarchies on demand
+            self._closure = {}
+
+    def manager(self, user_id):
+        return self._manager_of.get(user_id)
+
+    def team(self, manager_id, transitive=False):
+        """
+        Return the ids of the users reporting to a manager, directly or (transitive) at any depth.
+        """
+        if not transitive:
+            return self._reports.get(manager_id, frozenset())
+        closure = self._closure
+        team = closure.get(manager_id)
+        if team is None:
+            members, pending = set(), [manager_id]
+            while pending:
+                for report in self._reports.get(pending.pop(), ()):
+                    # Skip users already seen, so a cycle in the data cannot loop forever
+                    if report not in members and report != manager_id:
+                        members.add(report)
+                        pending.append(report)
+            team = closure[manager_id] = frozenset(members)
+        return team
+
+    def managers(self, user_id, transitive=False):
+        """
+        Return the manager of a user, or (transitive) every manager above them.
+        """
+        managers = []
+        manager_id = self._manager_of.get(user_id)
+        while manager_id is not None and manager_id not in managers and manager_id != user_id:
+            managers.append(manager_id)
+            if not transitive:
+                break
+            manager_id = self._manager_of.get(manager_id)
+        return managers
+
+
+def init_app(app):
+    """
+    Give the app its own index slot; the index is built from the app's database on first use.
+    """
+    app.extensions['team_index'] = {'index': None, 'lock': threading.Lock()}
+
+
+def get_index():
+    """
+    Return the team index of the current app, building it when missing or older than
+    TEAM_INDEX_TTL seconds.
+    """
+    slot = current_app.extensions['team_index']
+    ttl = current_app.config['TEAM_INDEX_TTL']
+    index = slot['index']
+    if index is None or (ttl and index.built + ttl < time.monotonic()):
+        with slot['lock']:
+            if slot['index'] is index:
+                slot['index'] = TeamIndex(db.session.execute(select(User.id, User.manager_id)).all())
+            index = slot['index']
+    return index
+
+
+def team_of(manager_id):
+    """
+    Ids of the users a manager may see and assign tasks to.
+    """
+    return get_index().team(manager_id, current_app.config['TEAM_HIERARCHY'])
+
+
+def manages(manager_id, user_id):
+    """
+    Whether a user is in a manager's team.
+    A miss is checked against the database, in case another process moved the user since
+    this process last rebuilt its index.
+    """
+    index = get_index()
+    transitive = current_app.config['TEAM_HIERARCHY']
+    if user_id in index.team(manager_id, transitive):
+        return True
+    row = db.session.execute(select(User.manager_id).where(User.id == user_id)).first()
+    stored = DELETED if row is None else row.manager_id
+    known = index.manager(user_id)
+    if stored == known or (stored is DELETED and known is None):
+        return False
+    # The index is stale for this user, apply the stored reporting line and check again
+    index.update({user_id: stored})
+    return user_id in index.team(manager_id, transitive)
+
+
+def managers_of(user_ids, build=True):
+    """
+    Ids of the managers whose teams include any of the given users.
+    Args:
+        user_ids: User ids to look up
+        build: Whether to build the index if needed; without it an unbuilt index gives no managers
+            (for callers that cannot query, e.g. after a commit)
+    """
+    index = get_index() if build else current_app.extensions['team_index']['index']
+    if index is None:
+        return set()
+    transitive = current_app.config['TEAM_HIERARCHY']
+    return {manager for user_id in user_ids for manager in index.managers(user_id, transitive)}
+
+
+# Collect reporting line changes in a flush and apply them once the transaction commits
+@event.listens_for(User, 'after_insert')
+def _mark_team_inserted(mapper, connection, target):
+    object_session(target).info.setdefault('team_changes', {})[target.id] = target.manager_id
+
+
+@event.listens_for(User, 'after_update')
+def _mark_team_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.manager_id.history.has_changes() or state.attrs.id.history.has_changes():
+        changes = object_session(target).info.setdefault('team_changes', {})
+        for user_id in state.attrs.id.history.deleted:
+            changes[user_id] = DELETED
+        changes[target.id] = target.manager_id
+
+
+@event.listens_for(User, 'after_delete')
+def _mark_team_deleted(mapper, connection, target):
+    object_session(target).info.setdefault('team_changes', {})[target.id] = DELETED
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_team_changes(session):
+    changes = session.info.pop('team_changes', None)
+    # Nothing to update before the index is first built, it will load the committed rows
+    index = current_app.extensions['team_index']['index'] if changes and has_app_context() else None
+    if index is not None:
+        index.update(changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_team_changes(session):
+    session.info.pop('team_changes', None)
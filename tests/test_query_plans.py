@@ -0,0 +1,107 @@
+# Query plan checks for task listings: each listing filter must be answered from an index
+# The listings are requested through the API against a small seeded SQLite database, and the
+# EXPLAIN QUERY PLAN of every task query they run is recorded.
+#
+# Usage: python -m pytest tests
+
+import datetime
+from types import SimpleNamespace
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app
+from blueprints.database.database import db, Task, User
+from listing import encode_cursor
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    """
+    App on a fresh SQLite database seeded with an admin, a manager with 20 users and 2000 tasks.
+    """
+    path = tmp_path_factory.mktemp('plans') / 'tasks.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % path, 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(username='admin', password='x', role='Admin'),
+                            User(username='manager', password='x', role='Manager')])
+        db.session.flush()
+        db.session.add_all([User(username='user%d' % i, password='x', role='User', manager_id=2) for i in range(20)])
+        db.session.flush()
+        # A third of the tasks are unassigned, every 50th matches the search below
+        db.session.add_all([Task(title='alpha %d' % i if i % 50 == 0 else 'task %d' % i, description='seeded',
+                                 status=('Done', 'Not Started', 'In Progress')[i % 3],
+                                 assigned_to=3 + i % 30 if i % 30 < 20 else None,
+                                 due_date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 365))
+                            for i in range(2000)])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture(scope='module')
+def headers(app):
+    """
+    Authorization headers of the admin and the manager.
+    """
+    with app.app_context():
+        return {role: {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+                for role, user_id in (('Admin', 1), ('Manager', 2))}
+
+
+@pytest.fixture
+def plans(app):
+    """
+    List collecting the query plan of every task query run while the test requests listings.
+    """
+    recorded = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT') and 'FROM task' in statement:
+            rows = cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            recorded.append(' | '.join(row[3] for row in rows))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', explain)
+    yield recorded
+    event.remove(engine, 'before_cursor_execute', explain)
+
+
+def listing_plan(app, headers, plans, url):
+    """
+    Request a listing and return the plan of the task query it ran.
+    """
+    response = app.test_client().get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json(), 'listing returned no tasks'
+    assert len(plans) == 1, plans
+    return plans[0]
+
+
+def test_assignee_and_status_filter_uses_composite_index(app, headers, plans):
+    plan = listing_plan(app, headers['Admin'], plans, '/api/tasks?assigned_to=3&status=Done')
+    assert 'USING INDEX ix_task_assigned_to_status (assigned_to=? AND status=?)' in plan
+
+
+def test_due_date_keyset_uses_due_date_index(app, headers, plans):
+    cursor = encode_cursor('due_date', SimpleNamespace(due_date=datetime.date(2025, 3, 1), id=50))
+    plan = listing_plan(app, headers['Admin'], plans, '/api/tasks?sort=due_date&limit=10&cursor=' + cursor)
+    assert 'USING INDEX ix_task_due_date (due_date>?)' in plan
+    # The index also provides the order
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_manager_scope_uses_assignee_index(app, headers, plans):
+    plan = listing_plan(app, headers['Manager'], plans, '/api/tasks?limit=10')
+    assert 'USING INDEX ix_task_assigned_to_status (assigned_to=?)' in plan
+    assert 'SCAN task' not in plan
+
+
+def test_search_uses_full_text_index(app, headers, plans):
+    plan = listing_plan(app, headers['Admin'], plans, '/api/tasks?q=alpha')
+    assert 'task_fts VIRTUAL TABLE INDEX' in plan
+    # Matching ids are looked up by primary key instead of scanning task with LIKE
+    assert 'USING INTEGER PRIMARY KEY (rowid=?)' in plan
@@ -0,0 +1,273 @@
+# Write-behind queue for task status updates (STATUS_WRITE_BEHIND)
+# User status updates are validated, appended to a local journal and acknowledged; a background
+# thread merges them per task (last write wins) and writes them in batched transactions, so
+# bursts of status flips no longer queue one by one on the database write lock. The journal is
+# replayed when the queue starts, and listings overlay queued statuses so users read their own writes.
+# Every process claims its own journal under an exclusive lock (see claim_journal), so workers of
+# one deployment never truncate or replace each other's journals.
+
+import atexit
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+from itertools import count, islice
+from flask import current_app
+from sqlalchemy import bindparam, or_, update
+from blueprints.database.database import db, Task
+from cache import tasks_changed
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): journals are not locked, run write-behind in one process only
+    fcntl = None
+
+
+def slot_path(path, slot):
+    """
+    Return the journal path of a slot: the configured path for slot 0, then
+    status-journal.1.log, status-journal.2.log, ...
+    """
+    if not slot:
+        return path
+    root, extension = os.path.splitext(path)
+    return '%s.%d%s' % (root, slot, extension)
+
+
+def lock_slot(path):
+    """
+    Take the exclusive lock of a journal without waiting.
+    The lock is held on a separate .lock file, which unlike the journal is never replaced.
+    Returns:
+        Open lock file, or None if another process holds the lock
+    """
+    lock = open(path + '.lock', 'a')
+    if fcntl is None:
+        return lock
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return None
+    return lock
+
+
+def claim_journal(path):
+    """
+    Claim the first journal slot no other process holds, e.g. one per gunicorn worker.
+    A restarted worker claims a free slot again and replays the journal left in it.
+    Args:
+        path: STATUS_JOURNAL_PATH, the journal of slot 0
+    Returns:
+        Journal path and its lock file, held until the queue stops
+    """
+    for slot in count():
+        lock = lock_slot(slot_path(path, slot))
+        if lock is not None:
+            return slot_path(path, slot), lock
+
+
+class StatusQueue:
+    """
+    Pending status updates keyed by task id, journaled before they are acknowledged.
+    Args:
+        app: Flask app, for config and the app context of the flush thread
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['STATUS_FLUSH_INTERVAL']
+        self.batch_size = app.config['STATUS_FLUSH_BATCH']
+        self.fsync = app.config['STATUS_JOURNAL_FSYNC']
+        # Task id -> (status, assignee id, time queued)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopping = False
+        configured = app.config['STATUS_JOURNAL_PATH']
+        os.makedirs(os.path.dirname(os.path.abspath(configured)), exist_ok=True)
+        self.path, self._slot_lock = claim_journal(configured)
+        self._replay(self.path)
+        # Take over journals of slots no process holds, left by a deployment with more workers
+        orphans = self._adopt_orphans(configured)
+        if self._pending:
+            self.app.logger.info('Replaying %d queued status updates', len(self._pending))
+        self._journal = open(self.path, 'a', encoding='utf-8')
+        if orphans:
+            # Keep the adopted updates in this journal before deleting theirs
+            self._compact()
+            for orphan, lock in orphans:
+                os.remove(orphan)
+                lock.close()
+        self._thread = threading.Thread(target=self._run, name='status-write-behind', daemon=True)
+        self._thread.start()
+
+    def _replay(self, path):
+        # Updates acknowledged before a crash or restart; later updates of a task win
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line was never acknowledged
+                    continue
+                queued_at = datetime.fromisoformat(entry['at'])
+                current = self._pending.get(entry['id'])
+                if current is None or current[2] <= queued_at:
+                    self._pending[entry['id']] = (entry['status'], entry['assignee'], queued_at)
+
+    def _adopt_orphans(self, configured):
+        """
+        Replay the journals of slots no process holds.
+        Returns:
+            List of (journal path, lock file) adopted, still locked
+        """
+        if fcntl is None:
+            return []
+        root, extension = os.path.splitext(configured)
+        orphans = []
+        for path in sorted(glob.glob(glob.escape(root) + '.*' + extension)):
+            if path == self.path or not path[len(root) + 1:-len(extension) or None].isdigit():
+                continue
+            lock = lock_slot(path)
+            if lock is None:
+                continue
+            self._replay(path)
+            orphans.append((path, lock))
+        return orphans
+
+    def enqueue(self, task_id, status, assignee_id):
+        """
+        Queue a status update; it is durable once this returns.
+        """
+        queued_at = datetime.utcnow()
+        line = json.dumps({'id': task_id, 'status': status, 'assignee': assignee_id, 'at': queued_at.isoformat()})
+        with self._lock:
+            self._journal.write(line + '\n')
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending[task_id] = (status, assignee_id, queued_at)
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def statuses(self):
+        """
+        Return the queued status of each pending task.
+        """
+        with self._lock:
+            return {task_id: entry[0] for task_id, entry in self._pending.items()}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wake.wait_for(lambda: len(self._pending) >= self.batch_size or self._stopping,
+                                    timeout=self.interval)
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = dict(islice(self._pending.items(), self.batch_size))
+            try:
+                self._write(batch)
+            except Exception:
+                # Keep the updates queued and journaled, and retry on the next interval
+                self.app.logger.exception('Failed to flush %d queued status updates', len(batch))
+                with self._lock:
+                    if self._stopping:
+                        return
+                    self._wake.wait(self.interval)
+                continue
+            with self._lock:
+                # Drop what was written, unless a newer update for the task arrived meanwhile
+                for task_id, entry in batch.items():
+                    if self._pending.get(task_id) is entry:
+                        del self._pending[task_id]
+                self._compact()
+
+    def _write(self, batch):
+        """
+        Apply a batch of updates in one transaction.
+        An update is skipped when the task was changed after it was queued (e.g. by an admin),
+        and the task's updated_at becomes the time the update was queued.
+        """
+        table = Task.__table__
+        statement = update(table).where(
+            table.c.id == bindparam('task_id'),
+            or_(table.c.updated_at.is_(None), table.c.updated_at <= bindparam('queued_at')),
+        ).values(status=bindparam('new_status'), updated_at=bindparam('queued_at'))
+        with self.app.app_context():
+            try:
+                db.session.execute(statement, [
+                    {'task_id': task_id, 'new_status': status, 'queued_at': queued_at}
+                    for task_id, (status, _, queued_at) in batch.items()])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            # Invalidate cached listings that include the tasks
+            tasks_changed([assignee for _, assignee, _ in batch.values()])
+
+    def _compact(self):
+        # Called with the lock held: the journal only needs the updates still pending
+        if not self._pending:
+            self._journal.truncate(0)
+            return
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as journal:
+            for task_id, (status, assignee_id, queued_at) in self._pending.items():
+                journal.write(json.dumps({'id': task_id, 'status': status, 'assignee': assignee_id,
+                                          'at': queued_at.isoformat()}) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary, self.path)
+        self._journal.close()
+        self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def stop(self):
+        """
+        Flush what is pending and stop the thread.
+        """
+        with self._lock:
+            self._stopping = True
+            self._wake.notify()
+        self._thread.join()
+        # Hand the slot over to the next process
+        self._journal.close()
+        self._slot_lock.close()
+
+
+def init_app(app):
+    """
+    Reserve the app's write-behind queue slot. The queue itself is created on first use so that
+    only a process serving requests (not the reloader's watcher or a password hashing worker)
+    replays the journal.
+    """
+    app.extensions['status_queue'] = {'queue': None, 'lock': threading.Lock()}
+
+
+def get_queue():
+    """
+    Return the app's write-behind queue, or None when updates are written synchronously.
+    The first call starts the queue, replaying the journal left by the previous run.
+    """
+    slot = current_app.extensions['status_queue']
+    if slot['queue'] is None and current_app.config['STATUS_WRITE_BEHIND']:
+        with slot['lock']:
+            if slot['queue'] is None:
+                slot['queue'] = StatusQueue(current_app._get_current_object())
+                # Write out what is still queued on a clean shutdown
+                atexit.register(slot['queue'].stop)
+    return slot['queue']
+
+
+def pending_statuses():
+    """
+    Return queued statuses by task id, empty when nothing is pending.
+    """
+    queue = get_queue()
+    return queue.statuses() if queue is not None else {}